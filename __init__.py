@@ -1,9 +1,11 @@
 import os
-import pkgutil
 import functools
-import re
+import json
 from typing import Optional, Any, ClassVar
 from itertools import product
+from collections import defaultdict
+from random import Random
+from types import SimpleNamespace
 
 from BaseClasses import CollectionState, ItemClassification, MultiWorld
 import settings
@@ -11,14 +13,17 @@ from worlds.AutoWorld import World, WebWorld
 
 from .client import TJEClient # required to register with BizHawkClient
 from .constants import MAILBOX_ITEM_REFS, VANILLA_RANK_THRESHOLDS, LEVEL_TO_VANILLA_EARTHLINGS, REV00_MD5, REV02_MD5
-from .generators import TJEGenerator, TJEInternalRNG, get_key_levels, item_totals, scaled_rank_thresholds, \
-                                                      get_point_present_value, get_average_promotion_value
-from .items import Item, TJEItem, ITEM_GROUPS, ITEM_ID_TO_CODE, ITEM_NAME_TO_ID, ITEM_NAME_TO_DATA, MASTER_ITEM_LIST, \
-                   ExtraItemCode, TJEItemType, create_items, create_starting_presents, create_starting_bucks, NO_DEPRIORITIZE_ITEMS
-from .locations import FLOOR_ITEM_LOC_TEMPLATE, MAILBOX_LOC_TEMPLATE, LOCATION_GROUPS, LOCATION_NAME_TO_ID
+from .generators import TJEGenerator, TJEInternalRNG, get_key_levels, get_point_present_value, get_average_promotion_value
+from .items import TJEItem, ITEM_GROUPS, ITEM_NAME_TO_ID, MASTER_ITEM_LIST, SHIP_PIECE_IDS, TJEItemTemplate, \
+                   create_items, create_starting_presents, create_starting_bucks, compile_item_templates, \
+                   place_local_filler
+from .logic import LEVEL_GATING_IDS, SHIP_PIECE_COUNTER, ResourceRule, invalidate_level_cache
+from .logic_tables import lookup_rank_thresholds, lookup_item_totals
+from .locations import MAILBOX_LOC_TEMPLATE, LOCATION_GROUPS, LOCATION_NAME_TO_ID, TJEMailboxLocation
 from .options import RankRescalingOption, EarthlingRandomizationOption, LocalShipPiecesOption, TJEOptions, GameVersionOption
 from .regions import create_regions
-from .rom import TJEProcedurePatch, write_tokens
+from .rom import TJEProcedurePatch, TJEPatchInputs, PATCH_DATA_FILE_ENDING, PATCH_OPTIONS, build_patch_files, \
+                 build_patch_tables, rom_is_rev00
 
 class TJESettings(settings.Group):
     class ROMFile(settings.UserFilePath):
@@ -34,7 +39,32 @@ class TJESettings(settings.Group):
             else:
                 return super().browse(filetypes, **kwargs)
 
+    class PatchWorkers(int):
+        """
+        Number of processes used to build patch files when generating with several ToeJam & Earl slots.
+        1 (the default) builds them one at a time in the main process; 0 uses one per CPU core.
+        Always serial when generating inside a daemonic process, e.g. on a WebHost.
+        """
+
+    class ReferenceBasePatches(settings.Bool):
+        """
+        Leave the base patch payloads out of generated .aptje files and reference them by hash instead, to be read
+        from the installed world when patching. Saves space in rooms with many ToeJam & Earl slots, but there is no
+        fallback: the payloads are not embedded as well, so the patch can only be applied by someone with the same
+        version of the world installed, and fails with an error naming the missing payload otherwise.
+        """
+
+    class CosmeticOverrides(str):
+        """
+        Optional YAML file of cosmetic settings (sound_rando, unused_present_sprites, walk_speed, present_timers,
+        and a "seed" for the random ones) to use instead of those chosen at generation whenever a patch is applied.
+        To change them on an already patched ROM, run: python -m worlds.tje.cosmetics <patch> <ROM>
+        """
+
     rom_file: ROMFile = ROMFile(ROMFile.copy_to)
+    patch_workers: PatchWorkers = PatchWorkers(1)
+    reference_base_patches: ReferenceBasePatches | bool = False
+    cosmetic_overrides: CosmeticOverrides = CosmeticOverrides("")
 
 class TJEWeb(WebWorld):
     theme = "partyTime"
@@ -57,12 +87,17 @@ class TJEWorld(World):
     def collect(self, state: "CollectionState", item: "TJEItem") -> bool:
         change = super().collect(state, item)
         if change:
+            # Elevator keys, ship pieces
+            if item.code in LEVEL_GATING_IDS:
+                invalidate_level_cache(state, item.player)
+                if item.code in SHIP_PIECE_IDS:
+                    state.prog_items[item.player][SHIP_PIECE_COUNTER] += 1
+
             # Bucks
             if item.buck_value > 0:
                 state.prog_items[item.player]["bucks"] += item.buck_value
-            if item.location is not None:
-                if item.location.name in LOCATION_GROUPS["Mailboxes"] and hasattr(item.location, "price"):
-                    state.prog_items[item.player]["bucks"] -= item.location.price
+            if isinstance(item.location, TJEMailboxLocation):
+                state.prog_items[item.player]["bucks"] -= item.location.price
 
             # Points, ranks
             if item.point_value > 0:
@@ -72,12 +107,17 @@ class TJEWorld(World):
     def remove(self, state: "CollectionState", item: "TJEItem") -> bool:
         change = super().remove(state, item)
         if change:
+            # Elevator keys, ship pieces
+            if item.code in LEVEL_GATING_IDS:
+                invalidate_level_cache(state, item.player)
+                if item.code in SHIP_PIECE_IDS:
+                    state.prog_items[item.player][SHIP_PIECE_COUNTER] -= 1
+
             # Bucks
             if item.buck_value > 0:
                 state.prog_items[item.player]["bucks"] -= item.buck_value
-            if item.location is not None:
-                if item.location.name in LOCATION_GROUPS["Mailboxes"] and hasattr(item.location, "price"):
-                    state.prog_items[item.player]["bucks"] += item.location.price
+            if isinstance(item.location, TJEMailboxLocation):
+                state.prog_items[item.player]["bucks"] += item.location.price
 
             # Points, ranks
             if item.point_value > 0:
@@ -96,6 +136,9 @@ class TJEWorld(World):
 
     def generate_early(self) -> None:
         self.seeds = [self.random.getrandbits(16) for _ in range(26)]
+        # Output is generated concurrently with other worlds, when the main RNG can't be relied on; derived rather
+        # than drawn so the world's own rolls stay the same
+        self.patch_random_seed = Random(f"{self.multiworld.seed}-{self.player}-patch").getrandbits(64)
         self.generator = TJEGenerator(self)
         self.tjerng = TJEInternalRNG()
         self.key_levels = (get_key_levels(self.options.key_gap.value, self.options.last_level.value)
@@ -153,6 +196,10 @@ class TJEWorld(World):
             mrc = self.options.max_rank_check.value
         return get_average_promotion_value(self.rank_thresholds, mrc)
 
+    @functools.cached_property
+    def item_templates(self) -> dict[str, TJEItemTemplate]:
+        return compile_item_templates(self)
+
     @functools.cached_property
     def rank_thresholds(self) -> list[int]:
         match self.options.rank_rescaling:
@@ -163,7 +210,7 @@ class TJEWorld(World):
                     scale_threshold = 8
                 else:
                     scale_threshold = self.options.max_rank_check.value
-                return scaled_rank_thresholds(self.options.last_level.value,
+                return lookup_rank_thresholds(self.options.last_level.value,
                                               self.options.min_items.value,
                                               self.options.max_items.value,
                                               scale_threshold
@@ -172,36 +219,11 @@ class TJEWorld(World):
     def create_item(self, identifier: str | int, new_classification: Optional[ItemClassification] = None) -> TJEItem:
         name = identifier if isinstance(identifier, str) else self.item_id_to_name[identifier]
 
-        data = ITEM_NAME_TO_DATA[name]
-        classification = new_classification if new_classification else data.classification
+        template = self.item_templates[name]
+        classification = new_classification if new_classification else template.classification
 
-        item = TJEItem(name, classification, self.item_name_to_id[name], self.player)
-        if self.options.max_rank_check.value > 0 and data.type == TJEItemType.PRESENT:
-            if name in ("Promotion", "Big Points"):
-                item.classification |= ItemClassification.progression
-            else:
-                item.classification |= ItemClassification.progression_skip_balancing
-            
-            if name not in NO_DEPRIORITIZE_ITEMS:
-                item.classification |= ItemClassification.deprioritized
-
-        match name:
-            case "Promotion":
-                value = self.avg_promotion_value
-            case "Big Points":
-                value = self.point_present_value
-            case _:
-                value = data.point_value
-        item.point_value = value
-
-        if self.options.mailbox_checks:
-            if data.buck_value > 0:
-                item.classification |= ItemClassification.progression_skip_balancing
-                if name in ("Extra Buck Present", "Buck"):
-                    item.classification |= ItemClassification.deprioritized
-        item.buck_value = data.buck_value
-
-        return item
+        return TJEItem(name, classification | template.extra_classification, template.id, self.player,
+                       template.point_value, template.buck_value)
 
     def create_items(self) -> None:
         create_items(self, self.multiworld, self.player, self.options)
@@ -216,12 +238,11 @@ class TJEWorld(World):
             for (n, (i, pos)) in enumerate(product(self.mailbox_levels, MAILBOX_ITEM_REFS)):
                 loc = self.get_location(MAILBOX_LOC_TEMPLATE.format(i, pos))
                 price = self.mailbox_item_prices[n]
-                loc.access_rule = lambda state, p=price: state.has("bucks", self.player, p)
+                loc.access_rule = ResourceRule(self.player, "bucks", price)
                 loc.price = price
 
-        self.multiworld.completion_condition[self.player] = (
-            lambda state: state.has_all(TJEWorld.item_name_groups["Ship Pieces"], self.player)
-        )
+        self.multiworld.completion_condition[self.player] = ResourceRule(self.player, SHIP_PIECE_COUNTER,
+                                                                         len(ITEM_GROUPS["Ship Pieces"]))
 
     def pre_fill(self) -> None:
         if self.options.local_ship_pieces.value == LocalShipPiecesOption.VANILLA:
@@ -231,88 +252,87 @@ class TJEWorld(World):
             for i, piece in enumerate(ship_piece_items):
                 big_item_locs[i].place_locked_item(piece)
 
-    def generate_output(self, output_directory: str):
-        self.create_patchable_item_list()
-        if self.options.mailbox_checks:
-            self.create_patchable_mailbox_item_list()
+    # Runs after every world's pre_fill, so that the item pool only needs filtering once for all TJE worlds
+    @classmethod
+    def stage_pre_fill(cls, multiworld: MultiWorld) -> None:
+        players = {player for player in multiworld.get_game_players(cls.game)
+                   if multiworld.worlds[player].options.local_filler_percentage.value > 0}
+        if not players:
+            return
+
+        filler = defaultdict(list)
+        for item in multiworld.itempool:
+            if item.player in players and item.classification == ItemClassification.filler:
+                filler[item.player].append(item)
+
+        placed = set()
+        for player in players:
+            placed.update(map(id, place_local_filler(multiworld.worlds[player], filler[player])))
+        if placed:
+            multiworld.itempool[:] = [item for item in multiworld.itempool if id(item) not in placed]
+
+    # Patches are built from picklable snapshots of each world, in parallel when there are several TJE slots.
+    # This runs alongside the other worlds' generate_output, so nothing here may use the worlds' main RNGs.
+    @classmethod
+    def stage_generate_output(cls, multiworld: MultiWorld, output_directory: str) -> None:
+        rom_rev00 = None
+        inputs = []
+        for player in multiworld.get_game_players(cls.game):
+            world = multiworld.worlds[player]
 
-        patch = TJEProcedurePatch(player=self.player, player_name=self.multiworld.player_name[self.player])
-        
-        # Apply REV00 → REV02 upgrade patch if required (either manually set to or autodetected as REV00)
-        if self.options.game_version == GameVersionOption.AUTO:
-            with open(self.settings.rom_file, "rb") as f:
-                header_part = f.read(0x18e)
-                rev00 = (header_part[0x18c:0x18e].decode("ascii") == "00")
-        else:
-            rev00 = (self.options.game_version == GameVersionOption.REV00)
+            # Either manually set to or autodetected as REV00
+            if world.options.game_version == GameVersionOption.AUTO:
+                if rom_rev00 is None:
+                    rom_rev00 = rom_is_rev00(cls.settings.rom_file)
+                rev00 = rom_rev00
+            else:
+                rev00 = (world.options.game_version == GameVersionOption.REV00)
+            print("REV00" if rev00 else "REV02")
 
-        if rev00:
-            print("REV00")
-            patch.hash = REV00_MD5
-            patch.procedure.insert(0, ("apply_bsdiff4", ["00to02.bsdiff4"]))
-            patch.write_file("00to02.bsdiff4", pkgutil.get_data(__name__, "data/00to02.bsdiff4"))
-        else:
-            print("REV02")
-            patch.hash = REV02_MD5
+            inputs.append(world.patch_inputs(output_directory, rev00, bool(cls.settings.reference_base_patches)))
+            world.write_patch_data(output_directory)
+
+        build_patch_files(inputs, cls.settings.patch_workers)
 
-        patch.write_file("base_patch.bsdiff4", pkgutil.get_data(__name__, "data/base_patch.bsdiff4"))
-        write_tokens(self, patch)
+    def patch_inputs(self, output_directory: str, rev00: bool, reference_base_patches: bool = False) -> TJEPatchInputs:
+        self.create_patch_tables()
 
         out_file_name = self.multiworld.get_out_file_name_base(self.player)
-        patch.write(os.path.join(output_directory, f"{out_file_name}{patch.patch_file_ending}"))
+        return TJEPatchInputs(
+            player=self.player,
+            player_name=self.multiworld.player_name[self.player],
+            output_path=os.path.join(output_directory, f"{out_file_name}{TJEProcedurePatch.patch_file_ending}"),
+            rev00=rev00,
+            reference_base_patches=reference_base_patches,
+            patch_random_seed=self.patch_random_seed,
+            options=SimpleNamespace(**{name: getattr(self.options, name) for name in PATCH_OPTIONS}),
+            seeds=self.seeds,
+            ship_item_levels=self.ship_item_levels,
+            key_levels=self.key_levels,
+            mailbox_levels=self.mailbox_levels,
+            starting_presents=self.starting_presents,
+            earthling_list=self.earthling_list,
+            map_reveal_potencies=self.map_reveal_potencies,
+            rank_thresholds=self.rank_thresholds,
+            point_present_value=self.point_present_value,
+            patchable_item_list=self.patchable_item_list,
+            mailbox_item_names=self.mailbox_item_names,
+            mailbox_item_types=self.mailbox_item_types,
+            mailbox_price_table=self.mailbox_price_table,
+        )
 
-    def item_to_tje_hex(self, item: Item) -> int:
-        if item.player == self.player:
-            return ITEM_ID_TO_CODE.get(item.code, 0xFF)
-        else:
-            if item.classification in \
-                (ItemClassification.progression, ItemClassification.progression_skip_balancing):
-                return ExtraItemCode.AP_ITEM_PROG # Progression AP item
-            else:
-                return ExtraItemCode.AP_ITEM # Regular AP item
-
-    def create_patchable_item_list(self):
-        items_per_level = item_totals(True, self.options.min_items.value, self.options.max_items.value)
-        self.patchable_item_list = [0xFF]*28
-        for level in range(1, self.options.last_level.value+1):
-            num = items_per_level[level]
-            for i in range(num):
-                item = self.get_location(FLOOR_ITEM_LOC_TEMPLATE.format(level, i+1)).item
-                item_hex = self.item_to_tje_hex(item)
-                self.patchable_item_list.append(item_hex)
-            self.patchable_item_list.extend([0xFF]*(28 - num))
-        assert len(self.patchable_item_list) == (self.options.last_level.value+1)*28
-
-    def shorten_item_name(self, name: str) -> str:
-        strip_chars = re.compile(f"[^a-zA-Z0-9 ?!',.-]")
-        try:
-            from ._vendor.unidecode import unidecode
-            string_processor = functools.partial(unidecode, errors="ignore", replace_str="")
-        except ImportError:
-            import unicodedata
-            string_processor = lambda s: unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii", "ignore")
-
-        #self.multiworld.player_name[item.player]
-        #item.game
-
-        processed = string_processor(name)
-        processed = processed.replace(": ", " - ")
-        processed = strip_chars.sub("", processed)
-        n = (processed[:26] + " ").ljust(30, ".") + " "
-        return n
-
-    def create_patchable_mailbox_item_list(self):
-        self.mailbox_item_names, self.mailbox_item_types = [], []
-        for (i, pos) in product(self.mailbox_levels, MAILBOX_ITEM_REFS):
-            item = self.get_location(MAILBOX_LOC_TEMPLATE.format(i, pos)).item
-            self.mailbox_item_names.append(self.shorten_item_name(item.name).encode("ascii") + b"\x00")
-            self.mailbox_item_types.append(self.item_to_tje_hex(item))
+    def create_patch_tables(self):
+        placements = ((loc.address, loc.item.code, loc.item.player, loc.item.name, loc.item.advancement)
+                      for loc in self.multiworld.get_locations(self.player) if loc.address is not None)
+        self.patchable_item_list, self.mailbox_item_names, self.mailbox_item_types, self.mailbox_price_table = \
+            build_patch_tables(self.player, self.options.last_level.value, self.mailbox_levels,
+                               self.mailbox_item_prices if self.options.mailbox_checks else [], placements)
 
     # For tracker use
     def fill_slot_data(self) -> dict[str, Any]:
         return self.options.as_dict("key_gap", "max_rank_check", "last_level") | {
             "key_level_access": self.key_levels + [self.options.last_level.value],
-            "items_per_level": item_totals(True, self.options.min_items.value, self.options.max_items.value),
+            "items_per_level": lookup_item_totals(self.options.min_items.value, self.options.max_items.value),
             "ship_item_levels": self.ship_item_levels,
             "rank_thresholds": self.rank_thresholds,
             "map_reveal_potencies": self.map_reveal_potencies,
@@ -321,3 +341,21 @@ class TJEWorld(World):
             "mailbox_item_prices": self.mailbox_item_prices if self.options.mailbox_checks else [],
             "lemonade_check": bool(self.options.lemonade_check.value),
         }
+
+    # What the patch needs beyond the slot data above and the placements in the multidata. Kept out of the slot data,
+    # which every client downloads, in a file that ends up in the output zip for regenerate.py to read
+    def write_patch_data(self, output_directory: str) -> None:
+        out_file_name = self.multiworld.get_out_file_name_base(self.player)
+        with open(os.path.join(output_directory, f"{out_file_name}{PATCH_DATA_FILE_ENDING}"), "w") as f:
+            json.dump(self.patch_data(), f)
+
+    def patch_data(self) -> dict[str, Any]:
+        return {
+            "options": self.options.as_dict(*PATCH_OPTIONS, "game_version"),
+            "patch_random_seed": self.patch_random_seed,
+            "seeds": self.seeds,
+            "key_levels": self.key_levels,
+            "starting_presents": self.starting_presents,
+            "earthling_list": self.earthling_list,
+            "point_present_value": self.point_present_value,
+        }
@@ -0,0 +1,41 @@
+import functools
+import json
+import pkgutil
+import struct
+from typing import Any, NamedTuple
+
+# Reader for data/assets.bin, built by tools/bundle_assets.py; see there for the layout
+
+BUNDLE_PATH = "data/assets.bin"
+BUNDLE_MAGIC, BUNDLE_VERSION = b"TJEA", 3
+
+class AssetBundle(NamedTuple):
+    blobs: memoryview
+    index: dict[str, dict[str, list[int]]]
+    dro: dict[str, dict[str, int]]
+    option_patches: list[dict[str, Any]]
+
+# Read once, whether installed as a folder or an .apworld, and never kept open: a mapping would lock the file on Windows
+@functools.cache
+def load_bundle() -> AssetBundle:
+    buffer = memoryview(pkgutil.get_data(__name__, BUNDLE_PATH))
+
+    if buffer[:4] != BUNDLE_MAGIC or buffer[4] != BUNDLE_VERSION:
+        raise ValueError("Asset bundle is missing or from an incompatible version; rebuild it with tools/bundle_assets.py")
+    (index_size,) = struct.unpack_from("<I", buffer, 5)
+    index = json.loads(bytes(buffer[9:9+index_size]))
+    return AssetBundle(buffer[9+index_size:], index, index.pop("dro"), index.pop("options"))
+
+def get_asset(name: str, sprite: bool = False) -> memoryview:
+    bundle = load_bundle()
+    offset, size = bundle.index["sprite" if sprite else "asm"][name]
+    return bundle.blobs[offset:offset+size]
+
+def get_dro() -> dict[str, dict[str, int]]:
+    return load_bundle().dro
+
+# (when, unless, token binary, override token indices) for each entry of tools/asm/optional_patches.json5, in order
+def get_option_patches() -> list[tuple[dict[str, Any], dict[str, Any], memoryview, list[int]]]:
+    bundle = load_bundle()
+    return [(entry["when"], entry["unless"], bundle.blobs[entry["tokens"][0]:entry["tokens"][0]+entry["tokens"][1]],
+             entry["overrides"]) for entry in bundle.option_patches]
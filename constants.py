@@ -91,18 +91,18 @@ DEATHLINK_MESSAGES = {
 
 #region Sound effects
 
-PCM_SFX_ADDRS = [0x00044d8a, 0x000491c8, 0x0004c276, 0x0004d75a, 0x0004dfa0, 0x0004f79a, 0x00051472, 0x00053920,
+PCM_SFX_ADDRS = (0x00044d8a, 0x000491c8, 0x0004c276, 0x0004d75a, 0x0004dfa0, 0x0004f79a, 0x00051472, 0x00053920,
                  0x00054626, 0x00055a9a, 0x0005747c, 0x0005a02e, 0x0005d7a0, 0x0005f5e2, 0x000601b4, 0x00061bd6,
                  0x00064178, 0x00067cba, 0x0006a13c, 0x0006ac3e, 0x0006b4a8, 0x0006f5aa, 0x0007177c, 0x000730de,
                  0x000741f0, 0x000752ba, 0x00076ecc, 0x0007763e, 0x00079170, 0x0007a2e2, 0x0007be44, 0x0007ccc6,
-                 0x0007de38, 0x0007e8ba, 0x0008233c, 0x0008381e, 0x00088060]
+                 0x0007de38, 0x0007e8ba, 0x0008233c, 0x0008381e, 0x00088060)
 
 # These four sounds are also used as part of the music
-PCM_SFX_ADDRS_MUSIC = [0x00089a42, 0x0008a4ac, 0x0008addc, 0x0008b104]
+PCM_SFX_ADDRS_MUSIC = (0x00089a42, 0x0008a4ac, 0x0008addc, 0x0008b104)
 
 # Excluding in Jam Out
 # Dynamically repatched: indices 3 and 34
-PCM_SFX_USAGE_ADDRS = [
+PCM_SFX_USAGE_ADDRS = (
     (0x0002009c, 0x0002160c), (0x0000f8c0, 0x0002b3fa), (0x0001b2e6,), (0x0001553e, 0x0001556a), (0x0001070c,),
     (0x0001663a, 0x000166f6), (0x0001015c, 0x0001059c, 0x0001089e, 0x00011cbe, 0x00023f8c), (0x0000fcda, 0x0001b3cc),
     (0x0000f3ca, 0x0002ad16, 0x0002ad42, 0x0002b1b2, 0x0002b200, 0x000378ea), (0x0001e600, 0x0003a658), (0x0001bdba,),
@@ -110,28 +110,28 @@ PCM_SFX_USAGE_ADDRS = [
     (0x000169c6, 0x00023daa), (0x0001c510,), (0x0000943c,), (0x0001b53c,), (), (0x00019d88, 0x00019e6c), (0x000200b6,),
     (0x0002135a,), (0x000120d2, 0x000120fa), (0x0001661e, 0x0001683c), (), (), (0x0000fa0c,), (0x0000fa1c,),
     (0x0000fa7e,), (0x00012598,), (0x000154d8,), (0x000125c6,), (0x00012580,)
-]
+)
 
-PCM_SFX_USAGE_ADDRS_MUSIC = [
+PCM_SFX_USAGE_ADDRS_MUSIC = (
     (0x00012182, 0x0002002a, 0x00020076, 0x0003779c, 0x0003efe6), (0x0003effe,), (0x0003efce,), (0x0001677a, 0x0003f01e)
-]
+)
 
 # Not included: the menu blip 0x7, rocket skates sound 0x5
-PSG_SFX = [0x1, 0x2, 0x3, 0x4, 0x8, 0xA, 0xC, 0xE, 0xF, 0x10, 0x11, 0x12, 0x14, 0x15, 0x16, 0x17, 0x18, 0x19, 0x1A]
+PSG_SFX = (0x1, 0x2, 0x3, 0x4, 0x8, 0xA, 0xC, 0xE, 0xF, 0x10, 0x11, 0x12, 0x14, 0x15, 0x16, 0x17, 0x18, 0x19, 0x1A)
 
 # Not included: menu blips @ (0x00009482, 0x000095ae, 0x000097f6, 0x00013d8a, 0x000239bc, 0x000239ea)
 #               rocket skates @ (0001738a, 000224f6)
 # Dynamically repatched: indices 0 and 11
-PSG_SFX_USAGE_ADDRS = [
-    [], (0x0001cd8c,), (0x00013db4,), (), (0x0002b6ba,), (0x0002b240,),
+PSG_SFX_USAGE_ADDRS = (
+    (), (0x0001cd8c,), (0x00013db4,), (), (0x0002b6ba,), (0x0002b240,),
     (0x000206ec,), (0x0001be8e,), (0x00014024,), (0x00015c0c, 0x0001f18c), (0x00013b38, 0x00013d36),
-    [0x000165ca, 0x000166ce, 0x00016c34], (0x0001db66, 0x0001dd80, 0x0001de9c),
+    (0x000165ca, 0x000166ce, 0x00016c34), (0x0001db66, 0x0001dd80, 0x0001de9c),
     (0x0002aede, 0x0002af76, 0x0003a690), (0x0002af36,), (0x00011c56,), (0x00013eb2, 0x00014134), (),
-    [0x00009a4e, 0x00009b1c, 0x00009da2, 0x00009e1a, 0x00021622, 0x00021b1e, 0x0002398a]
-]
+    (0x00009a4e, 0x00009b1c, 0x00009da2, 0x00009e1a, 0x00021622, 0x00021b1e, 0x0002398a)
+)
 
 # Not included: the cancel sound 0x0, various unused sounds
-SIMPLE_SFX = [0x2, 0x4, 0x9, 0xB, 0xD, 0xE, 0xF, 0x13, 0x14, 0x15, 0x16]
+SIMPLE_SFX = (0x2, 0x4, 0x9, 0xB, 0xD, 0xE, 0xF, 0x13, 0x14, 0x15, 0x16)
 
 SIMPLE_SFX_USAGE_ADDRS = (
     (0x0001c732,), (0x0001ca52,), (0x0001b094,), (0x0001c0be,), (0x0001cf54, 0x0001d072), (0x0001691e,),
@@ -142,27 +142,22 @@ SIMPLE_SFX_USAGE_ADDRS = (
 
 #region Inventory-related ROM addresses
 
-INV_REF_ADDRS_VANILLA = [0x0000934a+2, 0x000097aa+2, 0x000099a8+2, 0x000099ca+2, 0x00009b02+2, 
-                         0x00009d76+2, 0x00009dcc+2, 0x0000a23a+2, 0x0000a460+2, #0x00014310+2,
-                         0x0001542a+2, 0x00015442+2, 0x0001ac24+4, 0x00021fba+2, 0x0002227a+2]
-
-INV_SIZE_ADDRS_VANILLA = [0x00009396+3, 0x00014320+5, 0x00014328+3, 0x00015474+3, 0x0001547a+3, 0x00021fd8+3]
-
-INV_SIZE_ADDRS_INITIAL = (0x000143c2+5, 0x000143c8+5, 0x000143d6+5, 0x000143dc+5)
-
-INV_SIZE_ADDRS_ASL_D0_VANILLA = [0x00009358, 0x0000936c, 0x00009380, 0x000097a8, 0x00009a0c, 0x00009a64, 0x00009a8e,
-                                 0x00009a9c, 0x00009abc, 0x00009ad6, 0x00009b68, 0x00009b7c, 0x00009b8a, 0x00009baa,
-                                 0x00009bc4, 0x00009d74, 0x00009dca, 0x0000a238, 0x0000a45e, 0x00015428, 0x00015440,
-                                 0x00021fc6, 0x0002205a, 0x0002207e, 0x00022278]
-
 INITIAL_PRESENT_ADDRS = (0x00014393, 0x00014397, 0x000143a5, 0x000143ab,
                          0x000143c5, 0x000143cb, 0x000143d9, 0x000143df)
 
+PRESENT_TIMER_ADDRS = (0x00017334, 0x00017410) # Regular, Hi-Tops
+
+# Present sprite pointers, in present type order; only the first 26 are replaced by unused sprites
+PRESENT_SPRITE_TABLE = 0x00106000
+REPLACEABLE_PRESENT_SPRITES = 26
+UNUSED_PRESENT_SPRITES = (0x000aaee4, 0x000aaf92)
+
 #endregion
 
-#region Custom present–related ROM addresses
+#region Movement-related ROM addresses
 
-TOTAL_PRES_TYPES_PLUS_ONE_ADDRS = (0x00014298 + 3, 0x000142ba + 1, 0x000142d8 + 1)
+# Orthogonal and diagonal speed on land, then on roads
+WALK_SPEED_ADDRS = (0x0000f028, 0x0000f02c, 0x0000f038, 0x0000f03c)
 
 #endregion
 
@@ -341,7 +336,7 @@ DEAD_SPRITES = (0x5, 0x6)
 
 TRAP_NAMES = ("cupid", "burp", "sleep", "earthling", "skates", "randomizer", "downfall")
 
-BASE_LEVEL_TYPES = [0, 1, 5, 2, 7, 3, 4, 2, 6, 7, 2, 3, 6, 2, 4, 7, 2, 4, 2, 7, 4, 5, 1, 7]
+BASE_LEVEL_TYPES = (0, 1, 5, 2, 7, 3, 4, 2, 6, 7, 2, 3, 6, 2, 4, 7, 2, 4, 2, 7, 4, 5, 1, 7)
 
 CHARACTERS = ("Toejam", "Earl")
 
@@ -0,0 +1,79 @@
+"""
+Re-rolls the cosmetic settings of an already patched ROM (sound rando, unused present sprites, walk speed and
+present timers) without generating or patching again. Only the bytes the cosmetic sections can write are changed:
+they are put back to their uncosmetic state, from the cached base ROM and the patch's own tokens, and the cosmetic
+tokens for the new settings are written on top.
+
+Settings come from the cosmetic_overrides host setting or --overrides, then --set, then what the patch was
+generated with. Run from the root of an Archipelago checkout, e.g.:
+    python -m worlds.tje.cosmetics AP_12345678901234567890_P1_Player.aptje AP_12345678901234567890_P1_Player.bin \
+        --set sound_rando=all seed=random
+"""
+
+import argparse
+import json
+import os
+import time
+
+from .rom import COSMETICS_FILE, WORLD_VERSION, TJECosmetics, TJEPatchExtensions, TJEProcedurePatch, \
+                 cosmetic_tokens, read_cosmetic_overrides
+from .tokens import apply_tokens, parse_token_binary
+
+def reroll_cosmetics(patch: TJEProcedurePatch, rom: bytes, overrides: dict) -> bytes:
+    if COSMETICS_FILE not in patch.files:
+        raise ValueError("This patch was made before cosmetics could be re-rolled; patch the ROM again instead")
+    manifest = json.loads(patch.get_file(COSMETICS_FILE))
+    if manifest["world_version"] != WORLD_VERSION:
+        raise ValueError(f"This patch was made by version {manifest['world_version']} of the ToeJam & Earl world; "
+                         f"install it to re-roll cosmetics, the installed {WORLD_VERSION} may lay the ROM out differently")
+    cosmetics = TJECosmetics.from_manifest(manifest, overrides)
+
+    # The ROM as patched before any cosmetics; outside the cosmetic spans it must match the one given
+    _, base_patch_args = patch.procedure[0]
+    base = bytearray(TJEPatchExtensions.apply_base_patches(patch, TJEProcedurePatch.get_source_data(),
+                                                            *base_patch_args))
+    apply_tokens(base, parse_token_binary(patch.get_file("token_data.bin")))
+    rom = bytearray(rom)
+    for start, end in manifest["spans"]:
+        rom[start:end] = base[start:end]
+    if rom != base:
+        raise ValueError("The ROM was not patched from this file, or has been modified since")
+
+    apply_tokens(rom, cosmetic_tokens(cosmetics))
+    return bytes(rom)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-roll the cosmetic settings of a patched ToeJam & Earl ROM")
+    parser.add_argument("patch", help="the .aptje file the ROM was patched from")
+    parser.add_argument("rom", help="the patched ROM")
+    parser.add_argument("--overrides", help="YAML file of cosmetic settings (default: the cosmetic_overrides setting)")
+    parser.add_argument("--set", nargs="+", default=[], metavar="NAME=VALUE",
+                        help="cosmetic settings to change, e.g. walk_speed=150 sound_rando=all seed=random")
+    parser.add_argument("--output", help="where to write the re-rolled ROM (default: replace the patched ROM)")
+    args = parser.parse_args()
+
+    overrides = read_cosmetic_overrides(args.overrides)
+    for setting in args.set:
+        name, sep, value = setting.partition("=")
+        if not sep:
+            parser.error(f"Expected NAME=VALUE, got {setting!r}")
+        overrides[name] = value
+
+    patch = TJEProcedurePatch(path=args.patch)
+    patch.read()
+    with open(args.rom, "rb") as f:
+        rom = f.read()
+
+    start = time.perf_counter()
+    rom = reroll_cosmetics(patch, rom, overrides)
+    elapsed = time.perf_counter() - start
+
+    output = args.output or args.rom
+    temp_path = f"{output}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(rom)
+    os.replace(temp_path, output)
+    print(f"Re-rolled cosmetics in {1000*elapsed:.1f} ms; wrote {output}")
+
+if __name__ == "__main__":
+    main()
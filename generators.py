@@ -1,9 +1,11 @@
 import itertools
+import random
 import re
 import string
 import functools
+from bisect import bisect
 from collections import Counter
-from math import ceil, sqrt, comb, pow, inf
+from math import ceil, sqrt, inf, exp, lgamma, log
 
 from .constants import MAP_REVEAL_DIALOGUE_TEMPLATE, MAP_REVEAL_DIALOGUE_TEMPLATE_DEGEN, VANILLA_RANK_THRESHOLDS, \
                        EARTHLING_LIST, Earthling, LEVEL_TO_VANILLA_EARTHLINGS, PER_LEVEL_UNIQUE_EARTHLINGS, \
@@ -12,6 +14,15 @@ from .constants import MAP_REVEAL_DIALOGUE_TEMPLATE, MAP_REVEAL_DIALOGUE_TEMPLAT
                        FOOD_LIST, FOOD_WEIGHTS, BAD_FOOD_INDICES
 from .options import TJEOptions
 
+EARTHLING_VALUES = tuple(earthling_value(e) for e in EARTHLING_LIST)
+EARTHLING_INDICES_BY_VALUE: dict[int, tuple[int, ...]] = {
+    value: tuple(i for i, v in enumerate(EARTHLING_VALUES) if v == value) for value in set(EARTHLING_VALUES)
+}
+
+# Same result and RNG usage as random.choices(range(len(cum_weights)), cum_weights=cum_weights)[0]
+def weighted_index(rng: random.Random, cum_weights: list[float]) -> int:
+    return bisect(cum_weights, rng.random() * (cum_weights[-1] + 0.0), 0, len(cum_weights) - 1)
+
 class TJEGenerator():
     def __init__(self, world):
         self.random = world.random
@@ -21,6 +32,9 @@ class TJEGenerator():
         self.local_present_weights = PRESENT_WEIGHTS_BASE.copy()
         self.local_present_list = PRESENT_LIST_BASE.copy()
 
+        # Compiled (item codes, cumulative weights) per distribution; cleared whenever the weights or bans change
+        self.distribution_tables: dict[tuple, tuple[list[int], list[float]]] = {}
+
     def generate_full_random_earthlings(self):
         earthlings = []
         for _ in range(2,26):
@@ -64,21 +78,40 @@ class TJEGenerator():
         out = [[]]*24
         for level in levels:
             earthlings = []
+            budget = budgets[level]
+
+            # Weights are kept in EARTHLING_LIST order, with entries zeroed whenever an Earthling is out of budget,
+            # at its global limit or already present (if unique); cumulative weights are only rebuilt on a change
             level_weights_base = [weights[level] for weights in PER_LEVEL_EARTHLING_WEIGHTS]
-            while budgets[level] > 0 and len(earthlings) < EARTHLING_MAX_PER_LEVEL[level]:
-                # Remove weights for any earthling that's out of budget or already at max count, and normalize
-                level_weights = [w if earthling_value(e) <= budgets[level]
-                                 and earthling_running_count[e] < global_earthling_limits.get(e, inf)
-                                 and not (e in earthlings and e in PER_LEVEL_UNIQUE_EARTHLINGS)
-                                 else 0
-                                for e, w in zip(EARTHLING_LIST, level_weights_base)]    
-                level_weights = [w/sum(level_weights) for w in level_weights]
-
-                earthling = self.random.choices(EARTHLING_LIST, level_weights, k=1)[0]
+            excluded = [earthling_running_count[e] >= global_earthling_limits.get(e, inf) for e in EARTHLING_LIST]
+            level_weights = [0 if x or v > budget else w
+                             for w, v, x in zip(level_weights_base, EARTHLING_VALUES, excluded)]
+            cum_weights = None
+            while budget > 0 and len(earthlings) < EARTHLING_MAX_PER_LEVEL[level]:
+                if cum_weights is None:
+                    cum_weights = list(itertools.accumulate(level_weights))
+                    if cum_weights[-1] <= 0:
+                        break
+
+                i = weighted_index(self.random, cum_weights)
+                earthling = EARTHLING_LIST[i]
                 earthlings.append(earthling)
-                budgets[level] -= earthling_value(earthling)
                 if earthling in global_earthling_limits:
                     earthling_running_count[earthling] += 1
+                if earthling in PER_LEVEL_UNIQUE_EARTHLINGS or \
+                   earthling_running_count[earthling] >= global_earthling_limits.get(earthling, inf):
+                    excluded[i] = True
+                    level_weights[i] = 0
+                    cum_weights = None
+
+                # Only Earthlings valued between the old and new budgets can have moved in or out of budget
+                old_budget, budget = budget, budget - EARTHLING_VALUES[i]
+                for value in range(min(old_budget, budget)+1, max(old_budget, budget)+1):
+                    for j in EARTHLING_INDICES_BY_VALUE.get(value, ()):
+                        weight = 0 if excluded[j] or value > budget else level_weights_base[j]
+                        if weight != level_weights[j]:
+                            level_weights[j] = weight
+                            cum_weights = None
 
             # Only returning 24 levels' worth of data, so first index is 0 but corresponds to level 2
             out[level-2] = earthlings
@@ -89,20 +122,25 @@ class TJEGenerator():
             self.global_banned_presents.add(self.local_present_list.index(item_code))
         elif item_code in FOOD_LIST:
             self.global_banned_food.add(FOOD_LIST.index(item_code))
+        self.distribution_tables.clear()
 
     def forbid_bad_presents(self):
         self.global_banned_presents |= BAD_PRESENT_INDICES
+        self.distribution_tables.clear()
 
     def forbid_bad_food(self):
         self.global_banned_food |= BAD_FOOD_INDICES
+        self.distribution_tables.clear()
 
     def fewer_upwarps(self):
         self.local_present_weights[0xC] = 2
+        self.distribution_tables.clear()
     
     def enable_point_presents(self):
         self.local_present_weights[0xB] = 0.5
         self.local_present_list.append(0x1C)
         self.local_present_weights.append(1)
+        self.distribution_tables.clear()
 
     def get_present_distribution(self, level_one: bool=False, force_good: bool=False) -> tuple[list[int], list[float]]:
         forbiddens = set()
@@ -126,14 +164,28 @@ class TJEGenerator():
 
         return culled_food_list, culled_food_weights
 
+    def get_present_table(self, level_one: bool = False, force_good: bool = False) -> tuple[list[int], list[float]]:
+        key = ("present", level_one, force_good)
+        if key not in self.distribution_tables:
+            present_list, present_distro = self.get_present_distribution(level_one, force_good)
+            self.distribution_tables[key] = present_list, list(itertools.accumulate(present_distro))
+        return self.distribution_tables[key]
+
+    def get_food_table(self) -> tuple[list[int], list[float]]:
+        key = ("food",)
+        if key not in self.distribution_tables:
+            food_list, food_distro = self.get_food_distribution()
+            self.distribution_tables[key] = food_list, list(itertools.accumulate(food_distro))
+        return self.distribution_tables[key]
+
     # Not clear if this is actually uniformly randomly chosen in the code
     def get_random_food(self) -> int:
-        food_list, food_distro = self.get_food_distribution()
-        return self.random.choices(food_list, food_distro, k=1)[0]
+        food_list, food_cum_weights = self.get_food_table()
+        return food_list[weighted_index(self.random, food_cum_weights)]
 
     def get_random_present(self, level_one: bool = False) -> int:
-        present_list, present_distro = self.get_present_distribution(level_one)
-        return self.random.choices(present_list, present_distro, k=1)[0]
+        present_list, present_cum_weights = self.get_present_table(level_one)
+        return present_list[weighted_index(self.random, present_cum_weights)]
 
     # Follows the high-level logic of the game but does not use the same RNG function
     def get_random_item(self, level_one: bool = False, presentsanity: bool = False) -> int:
@@ -145,8 +197,26 @@ class TJEGenerator():
             return self.get_random_food()
         return A_BUCK
 
+    # Equivalent to repeated get_random_item calls (same results, same RNG usage), with the tables looked up once
     def generate_item_blob(self, number: int, presentsanity: bool = False) -> list[int]:
-        return [self.get_random_item(False, presentsanity) for _ in range(number)]
+        present_list, present_cum_weights = self.get_present_table()
+        food_list, food_cum_weights = self.get_food_table()
+        present_hi, present_total = len(present_cum_weights) - 1, present_cum_weights[-1] + 0.0
+        food_hi, food_total = len(food_cum_weights) - 1, food_cum_weights[-1] + 0.0
+        rand = self.random.random
+
+        blob = []
+        for _ in range(number):
+            if rand() < 0.5:
+                if presentsanity:
+                    blob.append(0x1A) # Mystery Present
+                else:
+                    blob.append(present_list[bisect(present_cum_weights, rand() * present_total, 0, present_hi)])
+            elif rand() < 0.75:
+                blob.append(food_list[bisect(food_cum_weights, rand() * food_total, 0, food_hi)])
+            else:
+                blob.append(A_BUCK)
+        return blob
 
     def total_points_in_pool(self, item_pool: list[int], promotion_value: int, point_present_value: int) -> int:
         def item_value(item_code: int, prom_val: int, point_pres_val: int) -> int:
@@ -193,8 +263,8 @@ class TJEGenerator():
                         break
 
     def generate_initial_inventory(self, force_good: bool) -> list[int]:
-        present_list, present_distro = self.get_present_distribution(False, force_good)
-        return self.random.choices(present_list, present_distro, k=4)
+        present_list, present_cum_weights = self.get_present_table(False, force_good)
+        return self.random.choices(present_list, cum_weights=present_cum_weights, k=4)
 
     # Follows the same procedure as the ROM but has a slightly different distribution of results as
     # this version avoids all failure states and does not use the game's own RNG function
@@ -222,23 +292,43 @@ class TJEGenerator():
             amounts[i] += 1
         return amounts
 
+    # Prices follow a Binomial(max_price, 1/2) distribution and are then adjusted to sum exactly to the budget
     def generate_item_prices(self, num_mailboxes: int, total_bucks: int) -> list[int]:
         num_items = 3*num_mailboxes
+        if num_items == 0:
+            return []
         max_price = round(2*total_bucks/num_items)
         # assume 10% of bucks will be "misspent"
-        budget = total_bucks - round(10/100*total_bucks)
-        binom_weights = [comb(max_price, i) * pow(0.5, max_price) for i in range(0,max_price+1)]
-
-        prices = []
-        while budget > 0 and len(prices) < num_items:
-            price = self.random.choices(range(0,max_price+1), binom_weights, k=1)[0]
-            budget = max(budget - price, 0)
-            prices.append(price)
-        prices += [0]*(num_items - len(prices))
-        self.random.shuffle(prices)
-
+        budget = min(total_bucks - round(10/100*total_bucks), num_items*max_price)
+
+        prices = self.random.choices(range(0,max_price+1), cum_weights=binomial_cum_weights(max_price), k=num_items)
+        return self.repair_item_prices(prices, budget, max_price)
+
+    # Scales prices proportionally towards the budget, then spreads what's left over randomly chosen items with room
+    # below the maximum price; the budget must be at most len(prices)*max_price
+    def repair_item_prices(self, prices: list[int], budget: int, max_price: int) -> list[int]:
+        total = sum(prices)
+        if total > 0:
+            prices = [min(price*budget//total, max_price) for price in prices]
+        shortfall = budget - sum(prices)
+
+        while shortfall > 0:
+            candidates = [i for i, price in enumerate(prices) if price < max_price]
+            self.random.shuffle(candidates)
+            share, extra = divmod(shortfall, len(candidates))
+            for n, i in enumerate(candidates):
+                added = min(share + (n < extra), max_price - prices[i])
+                prices[i] += added
+                shortfall -= added
         return prices
 
+# Computed in log-space so that large price ranges don't underflow
+@functools.cache
+def binomial_cum_weights(n: int) -> tuple[float, ...]:
+    log_pmf = [lgamma(n+1) - lgamma(i+1) - lgamma(n-i+1) + n*log(0.5) for i in range(n+1)]
+    peak = max(log_pmf)
+    return tuple(itertools.accumulate(exp(p - peak) for p in log_pmf))
+
 # Collectible items only; does not include trees
 def num_items_on_level(level: int, singleplayer: bool = True, min_items: int = 12, max_items: int = 28) -> int | None:
     if level < 0:
@@ -289,6 +379,11 @@ def expected_map_points_on_level(level: int) -> int:
 def expected_map_points(last_level: int) -> int:
     return sum(expected_map_points_on_level(i) for i in range(last_level+1))
 
+# Index n gives the map points expected from levels 0 to n inclusive
+@functools.cache
+def cumulative_map_points(last_level: int) -> tuple[int, ...]:
+    return tuple(itertools.accumulate(expected_map_points_on_level(i) for i in range(last_level+1)))
+
 # Half the items on a level are presents on average and they're worth 2 points each
 def expected_present_points_on_level(level: int, min_items: int = 12, max_items: int = 28) -> int:
     return num_items_on_level(level, min_items, max_items)
@@ -452,5 +547,22 @@ def to_inventory_name(name: str) -> list[int]:
 
     return codes + [0]*(14 - len(codes))
 
+try:
+    from ._vendor.unidecode import unidecode
+    to_ascii = functools.partial(unidecode, errors="ignore", replace_str="")
+except ImportError:
+    import unicodedata
+    to_ascii = lambda s: unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii", "ignore")
+
+MAILBOX_ITEM_NAME_STRIP = re.compile(r"[^a-zA-Z0-9 ?!',.-]")
+# Shortened names are always this long; the ROM stores them NUL-terminated
+MAILBOX_ITEM_NAME_LENGTH = 31
+
+def shorten_item_name(name: str) -> str:
+    processed = to_ascii(name)
+    processed = processed.replace(": ", " - ")
+    processed = MAILBOX_ITEM_NAME_STRIP.sub("", processed)
+    return (processed[:26] + " ").ljust(30, ".") + " "
+
 def to_mailbox_name(name: str) -> str:
     return (name[:12] + " ").ljust(13, ".")
\ No newline at end of file
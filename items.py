@@ -2,11 +2,12 @@ from typing import NamedTuple
 from enum import IntEnum
 from math import ceil
 
-from BaseClasses import Item, ItemClassification, MultiWorld
+from BaseClasses import Item, ItemClassification, LocationProgressType, MultiWorld
 
 from .constants import BASE_TJE_ID, TRAP_NAMES
-from .generators import item_totals, map_reveal_ranges, num_items_on_level
-from .locations import FLOOR_ITEM_LOC_TEMPLATE
+from .generators import map_reveal_ranges, num_items_on_level
+from .logic_tables import lookup_item_totals
+from .locations import FLOOR_ITEM_LOC_TEMPLATE, FLOOR_ITEM_LOCATION_NAMES
 from .options import TJEOptions, GameOverOption, StartingPresentOption, LocalShipPiecesOption
 
 # TODO: lots of redundancy here; needs a big clean-up
@@ -22,10 +23,16 @@ class ExtraItemCode(IntEnum):
 
 #region Item data
 
+# Slotted like the base Item, so point_value and buck_value must be set through the constructor
 class TJEItem(Item):
     game: str = "ToeJam & Earl"
-    point_value: int = 0
-    buck_value: int = 0
+    __slots__ = ("point_value", "buck_value")
+
+    def __init__(self, name: str, classification: ItemClassification, code: int | None, player: int,
+                 point_value: int = 0, buck_value: int = 0):
+        super().__init__(name, classification, code, player)
+        self.point_value = point_value
+        self.buck_value = buck_value
 
 # "Ethereal" is used for extra items such as elevator keys that do not exist in the base game
 class TJEItemType(IntEnum):
@@ -162,10 +169,70 @@ NO_DEPRIORITIZE_ITEMS = ("Promotion", "Big Points", "Icarus Wings", "Jackpot")
 
 #endregion
 
+#region Item templates
+
+# Everything about an item that depends only on the world's options, worked out once per world
+class TJEItemTemplate(NamedTuple):
+    name: str
+    id: int
+    type: TJEItemType
+    classification: ItemClassification
+    extra_classification: ItemClassification
+    point_value: int
+    buck_value: int
+
+def compile_item_templates(world) -> dict[str, TJEItemTemplate]:
+    rank_checks = world.options.max_rank_check.value > 0
+    mailbox_checks = bool(world.options.mailbox_checks)
+
+    templates = {}
+    for data in MASTER_ITEM_LIST:
+        name = data.name
+        extra = ItemClassification.filler
+        if rank_checks and data.type == TJEItemType.PRESENT:
+            if name in ("Promotion", "Big Points"):
+                extra |= ItemClassification.progression
+            else:
+                extra |= ItemClassification.progression_skip_balancing
+
+            if name not in NO_DEPRIORITIZE_ITEMS:
+                extra |= ItemClassification.deprioritized
+
+        if mailbox_checks and data.buck_value > 0:
+            extra |= ItemClassification.progression_skip_balancing
+            if name in ("Extra Buck Present", "Buck"):
+                extra |= ItemClassification.deprioritized
+
+        match name:
+            case "Promotion":
+                point_value = world.avg_promotion_value
+            case "Big Points":
+                point_value = world.point_present_value
+            case _:
+                point_value = data.point_value
+
+        templates[name] = TJEItemTemplate(name, ITEM_NAME_TO_ID[name], data.type, data.classification | extra, extra,
+                                          point_value, data.buck_value)
+    return templates
+
+# Bulk equivalent of calling world.create_item on each (in-game) item code with its default classification
+def create_items_from_codes(world, item_codes: list[int]) -> list[TJEItem]:
+    templates = {code: world.item_templates[ITEM_CODE_TO_NAME[code]] for code in set(item_codes)}
+    player = world.player
+
+    items = []
+    for code in item_codes:
+        template = templates[code]
+        items.append(TJEItem(template.name, template.classification, template.id, player,
+                             template.point_value, template.buck_value))
+    return items
+
+#endregion
+
 def create_items(world, multiworld: MultiWorld, player: int, options: TJEOptions) -> None:
     item_list: list[TJEItem] = []
 
-    total_locations = sum(item_totals(True, options.min_items.value, options.max_items.value, options.last_level.value))
+    total_locations = sum(lookup_item_totals(options.min_items.value, options.max_items.value, options.last_level.value))
 
     create_ship_pieces(multiworld, world, options, player, item_list)
 
@@ -256,16 +323,9 @@ def create_main_items(world, item_list, total_locations, differential, options:
     if options.max_rank_check.value > 0:
         world.generator.add_extra_promotions(item_pool_raw, world.rank_thresholds,
                                              world.avg_promotion_value, world.point_present_value, options)
-    bucks = 0
-    for item in item_pool_raw:
-        item_id = ITEM_CODE_TO_ID[item]
-        item_name = ITEM_ID_TO_NAME[item_id]
-        item_data = ITEM_NAME_TO_DATA[item_name]
-        bucks += item_data.buck_value
-        item_classification = item_data.classification
-
-        item_list.append(world.create_item(item_name, item_classification))
-    world.total_bucks = bucks
+    main_items = create_items_from_codes(world, item_pool_raw)
+    world.total_bucks = sum(item.buck_value for item in main_items)
+    item_list.extend(main_items)
 
 def create_starting_presents(world, multiworld: MultiWorld, options: TJEOptions) -> None:
     if options.presentsanity:
@@ -290,4 +350,35 @@ def create_starting_presents(world, multiworld: MultiWorld, options: TJEOptions)
 
 def create_starting_bucks(world, multiworld):
     for _ in range(3):
-        multiworld.push_precollected(world.create_item("Buck"))
\ No newline at end of file
+        multiworld.push_precollected(world.create_item("Buck"))
+
+# Places the configured share of a world's own plain filler into its own floor item locations ahead of the main fill.
+# Excluded locations are used first; once they run out, the rest goes into default ones (never priority ones), which
+# the main fill then no longer has for other items. Returns the items placed, which the caller must take out of the
+# item pool
+def place_local_filler(world, filler: list[TJEItem]) -> list[TJEItem]:
+    count = round(world.options.local_filler_percentage.value/100*len(filler))
+    if count == 0:
+        return []
+
+    locs = [loc for loc in world.multiworld.get_unfilled_locations(world.player)
+            if loc.name in FLOOR_ITEM_LOCATION_NAMES and loc.progress_type != LocationProgressType.PRIORITY]
+    world.random.shuffle(locs)
+    locs.sort(key=lambda loc: loc.progress_type != LocationProgressType.EXCLUDED)
+
+    unplaced = filler.copy()
+    world.random.shuffle(unplaced)
+    del unplaced[count:]
+
+    placed = []
+    state = world.multiworld.state
+    for loc in locs:
+        item = next((item for item in unplaced if loc.can_fill(state, item, False)), None)
+        if item is None:
+            continue
+        loc.place_locked_item(item)
+        unplaced.remove(item)
+        placed.append(item)
+        if not unplaced:
+            break
+    return placed
@@ -2,7 +2,7 @@ from enum import Enum, auto
 from typing import NamedTuple
 import itertools
 
-from BaseClasses import Location
+from BaseClasses import Location, Region
 
 from .constants import BASE_TJE_ID, RANK_NAMES, MAILBOX_ITEM_REFS
 from .generators import item_totals
@@ -18,6 +18,12 @@ class TJELocationType(Enum):
 class TJELocation(Location):
     game: str = "ToeJam & Earl"
 
+class TJEMailboxLocation(TJELocation):
+    def __init__(self, player: int, name: str = "", address: int | None = None, parent: Region | None = None,
+                 price: int = 0):
+        super().__init__(player, name, address, parent)
+        self.price = price
+
 class TJELocationData(NamedTuple):
     name: str
     type: TJELocationType
@@ -40,6 +46,8 @@ for level in range(1, 26):
         for i in range(max_items_per_level[level])
     ])
 
+FLOOR_ITEM_LOCATION_NAMES = frozenset(loc.name for loc in itertools.chain(*FLOOR_ITEM_LOCATIONS))
+
 SHIP_PIECE_LOCATIONS: list[TJELocationData] = [
     TJELocationData(BIG_ITEM_LOC_TEMPLATE.format(level), TJELocationType.SHIP_PIECE, level, None)
     for level in range(2, 26)
@@ -73,6 +81,18 @@ LOCATION_NAME_TO_ID : dict[str, int] = {
     for id, loc in enumerate(MASTER_LOCATION_LIST, BASE_TJE_ID)
 }
 
+# Patch table positions by location ID: floor items go in 28-byte per-level rows (level 0 included),
+# mailbox items are (level, position within that mailbox)
+FLOOR_TABLE_STRIDE = 28
+FLOOR_ITEM_TABLE_OFFSETS : dict[int, int] = {
+    LOCATION_NAME_TO_ID[loc.name]: loc.level*FLOOR_TABLE_STRIDE + loc.item_index-1
+    for loc in itertools.chain(*FLOOR_ITEM_LOCATIONS)
+}
+MAILBOX_ITEM_SLOTS : dict[int, tuple[int, int]] = {
+    LOCATION_NAME_TO_ID[MAILBOX_LOC_TEMPLATE.format(level, ref)]: (level, pos)
+    for level in range(2, 26) for pos, ref in enumerate(MAILBOX_ITEM_REFS)
+}
+
 LOCATION_ID_TO_NAME : dict[int, str] = {
     id: name
     for name, id in LOCATION_NAME_TO_ID.items()
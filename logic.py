@@ -0,0 +1,122 @@
+import itertools
+
+from BaseClasses import CollectionState, MultiWorld
+from worlds.AutoWorld import LogicMixin
+
+from .items import KEY_IDS, SHIP_PIECE_IDS
+
+# Items whose collection or removal can move the highest reachable level
+LEVEL_GATING_IDS = frozenset(KEY_IDS + SHIP_PIECE_IDS)
+
+# Custom counter kept up to date by TJEWorld.collect/remove, alongside "bucks" and "points"
+SHIP_PIECE_COUNTER = "ship pieces"
+
+# Not a counter: points plus the expected map points up to the highest reachable level, as checked by RankRule
+RANK_POINTS = "points + map points"
+
+class TJELogic(LogicMixin):
+    # Highest reachable level per TJE player, or absent if it needs recomputing
+    tje_highest_level: dict[int, int]
+
+    def init_mixin(self, multiworld: MultiWorld) -> None:
+        self.tje_highest_level = {}
+
+    def copy_mixin(self, new_state: CollectionState) -> CollectionState:
+        new_state.tje_highest_level = self.tje_highest_level.copy()
+        return new_state
+
+# The levels form a simple chain, so the highest reachable level is the first one whose elevator is locked:
+# either the level needing the next elevator key, or the second-last level if the ship pieces aren't all in hand
+def highest_reachable_level(state: CollectionState, player: int) -> int:
+    try:
+        return state.tje_highest_level[player]
+    except KeyError:
+        world = state.multiworld.worlds[player]
+        last_level = world.options.last_level.value
+
+        counts = state.prog_items[player]
+        keys = counts["Progressive Elevator Key"]
+        level = world.key_levels[keys] if keys < len(world.key_levels) else last_level
+        if level == last_level and counts[SHIP_PIECE_COUNTER] < 9:
+            level = last_level - 1
+
+        state.tje_highest_level[player] = level
+        return level
+
+def can_reach_level(state: CollectionState, player: int, level: int) -> bool:
+    return highest_reachable_level(state, player) >= level
+
+def invalidate_level_cache(state: CollectionState, player: int) -> None:
+    state.tje_highest_level.pop(player, None)
+
+#region Rule objects
+
+# Rules are plain objects rather than closures so that their requirements can be read back as
+# (resource, threshold) pairs, e.g. by spoiler or tracker tooling, without evaluating them
+
+class ResourceRule:
+    __slots__ = ("player", "resource", "threshold")
+
+    def __init__(self, player: int, resource: str, threshold: int):
+        self.player = player
+        self.resource = resource
+        self.threshold = threshold
+
+    def __call__(self, state: CollectionState) -> bool:
+        return state.prog_items[self.player][self.resource] >= self.threshold
+
+    @property
+    def requirements(self) -> tuple[tuple[str, int], ...]:
+        return ((self.resource, self.threshold),)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(player={self.player}, {self.resource} >= {self.threshold})"
+
+# Points from map exploration aren't tracked as items; they're looked up from the reachable depth instead
+class RankRule(ResourceRule):
+    __slots__ = ("map_points",)
+
+    def __init__(self, player: int, threshold: int, map_points: tuple[int, ...]):
+        super().__init__(player, "points", threshold)
+        self.map_points = map_points
+
+    def __call__(self, state: CollectionState) -> bool:
+        return (state.prog_items[self.player]["points"] + self.map_points[highest_reachable_level(state, self.player)]
+                >= self.threshold)
+
+    @property
+    def requirements(self) -> tuple[tuple[str, int], ...]:
+        return ((RANK_POINTS, self.threshold),)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(player={self.player}, {RANK_POINTS} >= {self.threshold})"
+
+class LevelGateRule:
+    __slots__ = ("player", "level", "requirements")
+
+    def __init__(self, player: int, level: int, requirements: tuple[tuple[str, int], ...]):
+        self.player = player
+        self.level = level
+        self.requirements = requirements
+
+    def __call__(self, state: CollectionState) -> bool:
+        return highest_reachable_level(state, self.player) > self.level
+
+    def __repr__(self) -> str:
+        reqs = ", ".join(f"{resource} >= {threshold}" for resource, threshold in self.requirements)
+        return f"{type(self).__name__}(player={self.player}, leave level {self.level}: {reqs})"
+
+def level_gate_rule(world, level: int) -> LevelGateRule:
+    requirements = []
+    if level in world.key_levels:
+        requirements.append(("Progressive Elevator Key", world.key_levels.index(level)+1))
+    if level == world.options.last_level.value-1:
+        requirements.append((SHIP_PIECE_COUNTER, 9))
+    return LevelGateRule(world.player, level, tuple(requirements))
+
+def rule_table(world) -> dict[str, tuple[tuple[str, int], ...]]:
+    spots = world.multiworld.get_locations(world.player), world.multiworld.get_entrances(world.player)
+    return {spot.name: spot.access_rule.requirements
+            for spot in itertools.chain(*spots) if hasattr(spot.access_rule, "requirements")}
+
+#endregion
@@ -0,0 +1,61 @@
+import functools
+import pkgutil
+import sys
+import zlib
+from array import array
+from itertools import product
+
+# Precomputed results of the option-only logic functions in generators.py, built by tools/build_logic_tables.py.
+# Layout: magic, version byte, then zlib-compressed little-endian u16s: rank thresholds for every table key,
+# followed by floor item totals for every (min_items, max_items) pair
+
+TABLE_PATH = "data/logic_tables.bin"
+TABLE_MAGIC, TABLE_VERSION = b"TJLT", 1
+
+LAST_LEVELS = range(11, 26)
+ITEM_COUNTS = range(4, 29)
+MAX_RANKS = range(1, 9)
+
+NUM_RANK_THRESHOLDS = 9
+NUM_LEVELS = 26
+
+RANK_KEYS = tuple(product(LAST_LEVELS, ITEM_COUNTS, ITEM_COUNTS, MAX_RANKS))
+ITEM_TOTAL_KEYS = tuple(product(ITEM_COUNTS, ITEM_COUNTS))
+
+def encode_tables(rank_thresholds: list[list[int]], item_totals: list[list[int]]) -> bytes:
+    values = array("H", [v for row in rank_thresholds for v in row] + [v for row in item_totals for v in row])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return TABLE_MAGIC + bytes([TABLE_VERSION]) + zlib.compress(values.tobytes(), 9)
+
+def decode_tables(data: bytes) -> array:
+    if data[:4] != TABLE_MAGIC or data[4] != TABLE_VERSION:
+        raise ValueError("Logic table file is missing or from an incompatible version; rebuild it")
+    values = array("H")
+    values.frombytes(zlib.decompress(data[5:]))
+    if sys.byteorder != "little":
+        values.byteswap()
+    if len(values) != len(RANK_KEYS)*NUM_RANK_THRESHOLDS + len(ITEM_TOTAL_KEYS)*NUM_LEVELS:
+        raise ValueError("Logic table file has the wrong size; rebuild it")
+    return values
+
+@functools.cache
+def load_tables() -> array:
+    return decode_tables(pkgutil.get_data(__name__, TABLE_PATH))
+
+def rank_thresholds_index(last_level: int, min_items: int, max_items: int, desired_max_rank: int) -> int:
+    return (((last_level - LAST_LEVELS.start)*len(ITEM_COUNTS) + min_items - ITEM_COUNTS.start)*len(ITEM_COUNTS)
+            + max_items - ITEM_COUNTS.start)*len(MAX_RANKS) + desired_max_rank - MAX_RANKS.start
+
+def item_totals_index(min_items: int, max_items: int) -> int:
+    return (min_items - ITEM_COUNTS.start)*len(ITEM_COUNTS) + max_items - ITEM_COUNTS.start
+
+# Same as generators.scaled_rank_thresholds
+def lookup_rank_thresholds(last_level: int, min_items: int, max_items: int, desired_max_rank: int) -> list[int]:
+    start = rank_thresholds_index(last_level, min_items, max_items, desired_max_rank)*NUM_RANK_THRESHOLDS
+    return load_tables()[start:start+NUM_RANK_THRESHOLDS].tolist()
+
+# Same as generators.item_totals in singleplayer mode
+def lookup_item_totals(min_items: int, max_items: int, last_level: int = 25) -> list[int]:
+    start = len(RANK_KEYS)*NUM_RANK_THRESHOLDS + item_totals_index(min_items, max_items)*NUM_LEVELS
+    return load_tables()[start:start+last_level+1].tolist()
@@ -470,6 +470,23 @@ class TrapPercentage(Range):
 
     default = 3
 
+class LocalFillerPercentage(Range):
+    """
+    What percentage of this world's plain filler items (food, bucks and non-progression presents) will be placed
+    directly into its own floor item locations before the main fill. Excluded locations are filled first; once
+    they run out, other floor item locations are used, except priority ones.
+
+    Higher values make generation faster in large multiworlds, at the cost of fewer of your locations holding
+    other players' items.
+    """
+
+    display_name = "Local Filler Percentage"
+
+    range_start = 0
+    range_end = 100
+
+    default = 0
+
 class StartingPresents(Choice):
     """
     TJ/E's starting presents.
@@ -670,6 +687,7 @@ tje_option_groups = [
         MaxItemCount,
         LastLevel,
         LocalShipPieces,
+        LocalFillerPercentage,
     ]),
     OptionGroup("Auto/Bad/Trap Options", [
         AutoOpenBadPresents,
@@ -723,6 +741,7 @@ class TJEOptions(PerGameCommonOptions):
     max_items: MaxItemCount
     last_level: LastLevel
     local_ship_pieces: LocalShipPieces
+    local_filler_percentage: LocalFillerPercentage
     auto_bad_presents: AutoOpenBadPresents
     auto_buck_presents: AutoOpenBuckPresents
     auto_point_presents: AutoOpenPointPresents
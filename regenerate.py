@@ -0,0 +1,157 @@
+"""
+Rebuilds TJE patch files from a finished multiworld without generating it again: placements and item names come
+from the .archipelago multidata, and everything else the patching sections need from its slot data and the patch data
+file written next to each patch. Both are in the output zip; a bare .archipelago needs the patch data files beside it.
+Useful for re-issuing a lost patch, or every patch in a room after a fix to the ROM code.
+
+Run from the root of an Archipelago checkout, e.g.:
+    python -m worlds.tje.regenerate output/AP_12345678901234567890.zip
+    python -m worlds.tje.regenerate AP_12345678901234567890.archipelago --player 3 "Player Four" --output-dir out
+"""
+
+import argparse
+import json
+import os
+import zipfile
+import zlib
+from types import SimpleNamespace
+from typing import Any
+
+from BaseClasses import ItemClassification
+from NetUtils import SlotType
+from Utils import get_file_safe_name, restricted_loads
+from settings import get_settings
+
+from .options import GameVersionOption, TJEOptions
+from .rom import PATCH_DATA_FILE_ENDING, TJEPatchInputs, TJEProcedurePatch, build_patch_files, build_patch_tables, \
+                 rom_is_rev00
+
+GAME = "ToeJam and Earl"
+MULTIDATA_FORMAT_VERSION = 3
+
+def load_multidata(path: str) -> dict[str, Any]:
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            name = next((name for name in archive.namelist() if name.endswith(".archipelago")), None)
+            if name is None:
+                raise ValueError(f"{path} does not contain a .archipelago file")
+            data = archive.read(name)
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+
+    if data[0] > MULTIDATA_FORMAT_VERSION:
+        raise ValueError(f"{path} uses multidata format {data[0]}, which is newer than this tool supports")
+    return restricted_loads(zlib.decompress(data[1:]))
+
+# Every slot's patch data, by file name, from the output zip or the directory holding the .archipelago file
+def load_patch_data(path: str) -> dict[str, dict[str, Any]]:
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return {name: json.loads(archive.read(name)) for name in archive.namelist()
+                    if name.endswith(PATCH_DATA_FILE_ENDING)}
+
+    patch_data = {}
+    for entry in os.scandir(os.path.dirname(path) or "."):
+        if entry.is_file() and entry.name.endswith(PATCH_DATA_FILE_ENDING):
+            with open(entry.path) as f:
+                patch_data[entry.name] = json.load(f)
+    return patch_data
+
+# Slot numbers of the TJE players to rebuild, selected by number or name; all of them if none are given
+def select_slots(multidata: dict[str, Any], selection: list[str] | None) -> list[int]:
+    slots = {slot: info for slot, info in multidata["slot_info"].items()
+             if info.game == GAME and info.type == SlotType.player}
+    if not selection:
+        return sorted(slots)
+
+    selected = []
+    for wanted in selection:
+        slot = next((slot for slot, info in slots.items() if str(slot) == wanted or info.name == wanted), None)
+        if slot is None:
+            raise ValueError(f"No {GAME} slot numbered or named {wanted!r}")
+        selected.append(slot)
+    return selected
+
+# Same as MultiWorld.get_out_file_name_base, so rebuilt patches replace the originals: default names are left out
+def out_file_name_base(seed_name: str, player: int, player_name: str) -> str:
+    if player_name == f"Player{player}":
+        return f"AP_{seed_name}_P{player}"
+    return f"AP_{seed_name}_P{player}_{get_file_safe_name(player_name).replace(' ', '_')}"
+
+def slot_patch_data(multidata: dict[str, Any], all_patch_data: dict[str, dict[str, Any]],
+                    player: int) -> dict[str, Any]:
+    name = out_file_name_base(multidata["seed_name"], player, multidata["slot_info"][player].name) \
+           + PATCH_DATA_FILE_ENDING
+    if name not in all_patch_data:
+        raise ValueError(f"No {name} for slot {player}; it was either generated before patch data was saved, "
+                         f"or the file is not in the output zip or next to the .archipelago file")
+    return all_patch_data[name]
+
+def slot_patch_inputs(multidata: dict[str, Any], patch_data: dict[str, Any], player: int, output_directory: str,
+                      rom_rev00: bool | None, reference_base_patches: bool) -> TJEPatchInputs:
+    slot_data = multidata["slot_data"][player]
+    options = {name: TJEOptions.type_hints[name].from_any(value) for name, value in patch_data["options"].items()}
+
+    slot_info = multidata["slot_info"]
+    item_names = {game: {item_id: name for name, item_id in package["item_name_to_id"].items()}
+                  for game, package in multidata["datapackage"].items()}
+    placements = ((location_id, item_id, item_player, item_names[slot_info[item_player].game][item_id],
+                   bool(flags & ItemClassification.progression))
+                  for location_id, (item_id, item_player, flags) in multidata["locations"][player].items())
+    tables = build_patch_tables(player, slot_data["last_level"], slot_data["mailbox_levels"],
+                                slot_data["mailbox_item_prices"], placements)
+
+    # Resolved the same way as during generation
+    if options["game_version"] == GameVersionOption.AUTO:
+        rev00 = rom_rev00
+    else:
+        rev00 = options["game_version"] == GameVersionOption.REV00
+
+    player_name = slot_info[player].name
+    out_file_name = out_file_name_base(multidata["seed_name"], player, player_name)
+    return TJEPatchInputs(
+        player=player,
+        player_name=player_name,
+        output_path=os.path.join(output_directory, f"{out_file_name}{TJEProcedurePatch.patch_file_ending}"),
+        rev00=rev00,
+        reference_base_patches=reference_base_patches,
+        patch_random_seed=patch_data["patch_random_seed"],
+        options=SimpleNamespace(**{name: option for name, option in options.items() if name != "game_version"}),
+        seeds=patch_data["seeds"],
+        ship_item_levels=slot_data["ship_item_levels"],
+        key_levels=patch_data["key_levels"],
+        mailbox_levels=slot_data["mailbox_levels"],
+        starting_presents=patch_data["starting_presents"],
+        earthling_list=patch_data["earthling_list"],
+        map_reveal_potencies=slot_data["map_reveal_potencies"],
+        rank_thresholds=slot_data["rank_thresholds"],
+        point_present_value=patch_data["point_present_value"],
+        **tables._asdict(),
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=f"Rebuild {GAME} patch files from a generated multiworld")
+    parser.add_argument("multidata", help="the .archipelago file, or the output .zip containing it")
+    parser.add_argument("--player", nargs="+", help="slot numbers or names to rebuild (default: every TJE slot)")
+    parser.add_argument("--output-dir", default=".", help="where to write the patch files")
+    parser.add_argument("--workers", type=int, default=0, help="processes to build patches with (0: one per core)")
+    args = parser.parse_args()
+
+    multidata = load_multidata(args.multidata)
+    all_patch_data = load_patch_data(args.multidata)
+    slots = select_slots(multidata, args.player)
+    patch_data = {slot: slot_patch_data(multidata, all_patch_data, slot) for slot in slots}
+    tje_settings = get_settings().tje_options
+    auto_slots = [slot for slot in slots if patch_data[slot]["options"]["game_version"] == GameVersionOption.AUTO]
+    rom_rev00 = rom_is_rev00(tje_settings.rom_file) if auto_slots else None
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    inputs = [slot_patch_inputs(multidata, patch_data[slot], slot, args.output_dir, rom_rev00,
+                                bool(tje_settings.reference_base_patches))
+              for slot in slots]
+    for path in build_patch_files(inputs, args.workers):
+        print(f"Wrote {path}")
+
+if __name__ == "__main__":
+    main()
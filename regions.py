@@ -1,15 +1,18 @@
+import functools
 from typing import NamedTuple
 from itertools import product
 
-from BaseClasses import Region, MultiWorld, LocationProgressType, ItemClassification
-from worlds.generic.Rules import forbid_item, forbid_items_for_player, add_rule
+from BaseClasses import Region, MultiWorld, LocationProgressType
+from worlds.generic.Rules import forbid_item, forbid_items_for_player
 
 from .constants import RANK_NAMES, MAILBOX_ITEM_REFS
-from .items import EDIBLE_IDS, ITEM_ID_TO_NAME, TJEItem
-from .generators import expected_map_points_on_level, item_totals
+from .items import EDIBLE_IDS, ITEM_ID_TO_NAME
+from .generators import cumulative_map_points
+from .logic_tables import lookup_item_totals
+from .logic import RankRule, level_gate_rule
 from .options import TJEOptions
-from .locations import TJELocation, FLOOR_ITEM_LOCATIONS, SHIP_PIECE_LOCATIONS, RANK_LOC_TEMPLATE, REACH_LOC_TEMPLATE, \
-                                    MAILBOX_LOC_TEMPLATE, LEMONADE_LOC_NAME
+from .locations import TJELocation, TJEMailboxLocation, FLOOR_ITEM_LOCATIONS, SHIP_PIECE_LOCATIONS, LOCATION_NAME_TO_ID, \
+                                    RANK_LOC_TEMPLATE, REACH_LOC_TEMPLATE, MAILBOX_LOC_TEMPLATE, LEMONADE_LOC_NAME
 
 class TJERegion(NamedTuple):
     name: str
@@ -55,15 +58,17 @@ def create_regions(multiworld: MultiWorld, player: int, options: TJEOptions):
 
     connect_regions_basic(level_regions, options)
 
-    add_floor_items(world, player, options, level_regions)
+    layout = level_layout(options.min_items.value, options.max_items.value, options.last_level.value,
+                          bool(options.reach_level_checks))
+
+    add_layout_locations(player, layout.floor_items, level_regions)
     add_ship_pieces(world, player, level_regions)
-    handle_final_ship_piece(multiworld, options, player)
 
     restrict_lv1_items(level_regions)
 
-    handle_key_options(multiworld, world, player, options)
+    handle_level_gates(multiworld, world, player, options)
     handle_rank_options(multiworld, world, player, options, level_regions)
-    handle_reach_options(player, world, options, level_regions)
+    add_layout_locations(player, layout.reach_checks, level_regions)
     handle_mailbox_options(player, world, options, level_regions)
     handle_lemonade_options(player, world, options, level_regions)
 
@@ -90,25 +95,16 @@ def restrict_lv1_items(level_regions):
 
 #region Options handling routines
 
-def handle_key_options(multiworld, world, player,  options: TJEOptions):
-    for i in world.key_levels:
-        add_rule(multiworld.get_entrance(f"Level {i} Elevator", player),
-                    lambda state, lvl=i: state.has("Progressive Elevator Key", player, world.key_levels.index(lvl)+1))
-
-def handle_final_ship_piece(multiworld, options: TJEOptions, player):
-    add_rule(multiworld.get_entrance(f"Level {options.last_level.value-1} Elevator", player),
-                lambda state: state.has_group("Ship Pieces", player, 9))
+# Elevators are locked on key levels and on the second-last level (which requires all other ship pieces);
+# all of these are resolved at once by the cached highest reachable level
+def handle_level_gates(multiworld, world, player, options: TJEOptions):
+    for i in set(world.key_levels) | {options.last_level.value-1}:
+        multiworld.get_entrance(f"Level {i} Elevator", player).access_rule = level_gate_rule(world, i)
 
 def handle_rank_options(multiworld, world, player,  options: TJEOptions, level_regions):
     if options.max_rank_check > 0:
         menu_region = multiworld.get_region("Menu", player)
         add_rank_checks(menu_region, world, player, options)
-        for i in range(0, options.last_level.value+1):
-            add_exploration_points(level_regions[i], player, i)
-
-def handle_reach_options(player, world, options: TJEOptions, level_regions: list[Region]):
-    if options.reach_level_checks:
-        add_reach_level_checks(player, world, options, level_regions)
 
 def handle_mailbox_options(player, world, options: TJEOptions, level_regions: list[Region]):
     if options.mailbox_checks:
@@ -122,20 +118,57 @@ def handle_lemonade_options(player, world, options: TJEOptions, level_regions: l
 
 #endregion
 
-#region Main location adding routines
+#region Layout cache
 
-def add_floor_items(world, player,  options: TJEOptions, level_regions):
-    per_level_limits = item_totals(True, options.min_items.value, options.max_items.value)
-    for i in range(1, options.last_level.value+1):
-        locs_to_add: list[TJELocation] = []
+# Fixed locations depend only on a few options, so players sharing those share a single precomputed layout
+
+class LocationSpec(NamedTuple):
+    name: str
+    id: int
+    progress_type: LocationProgressType
+
+# Indexed by level number, as for TJE_LEVEL_LIST
+LocationLayout = tuple[tuple[LocationSpec, ...], ...]
+
+class LevelLayout(NamedTuple):
+    floor_items: LocationLayout
+    reach_checks: LocationLayout
+
+@functools.cache
+def level_layout(min_items: int, max_items: int, last_level: int, reach_level_checks: bool) -> LevelLayout:
+    floor_items = [[] for _ in TJE_LEVEL_LIST]
+    per_level_limits = lookup_item_totals(min_items, max_items)
+    for i in range(1, last_level+1):
         for loc_data in FLOOR_ITEM_LOCATIONS[i][:per_level_limits[i]]:
-            new_loc = TJELocation(player, loc_data.name, world.location_name_to_id[loc_data.name],
-                                  level_regions[loc_data.level])
             # No progression items on the two potentially inaccessible islands on Level 1
             if loc_data.level == 1 and loc_data.item_index > 4:
-                new_loc.progress_type = LocationProgressType.EXCLUDED
-            locs_to_add.append(new_loc)
-        level_regions[i].locations.extend(locs_to_add)
+                progress_type = LocationProgressType.EXCLUDED
+            else:
+                progress_type = LocationProgressType.DEFAULT
+            floor_items[loc_data.level].append(LocationSpec(loc_data.name, LOCATION_NAME_TO_ID[loc_data.name],
+                                                            progress_type))
+
+    reach_checks = [[] for _ in TJE_LEVEL_LIST]
+    if reach_level_checks:
+        for i in range(2, last_level+1):
+            loc_name = REACH_LOC_TEMPLATE.format(i)
+            reach_checks[i].append(LocationSpec(loc_name, LOCATION_NAME_TO_ID[loc_name], LocationProgressType.DEFAULT))
+
+    return LevelLayout(tuple(map(tuple, floor_items)), tuple(map(tuple, reach_checks)))
+
+#endregion
+
+#region Main location adding routines
+
+def add_layout_locations(player, layout: LocationLayout, level_regions: list[Region]):
+    for region, specs in zip(level_regions, layout):
+        if specs:
+            region.locations.extend(create_layout_location(player, spec, region) for spec in specs)
+
+def create_layout_location(player, spec: LocationSpec, region: Region) -> TJELocation:
+    loc = TJELocation(player, spec.name, spec.id, region)
+    loc.progress_type = spec.progress_type
+    return loc
 
 def add_ship_pieces(world, player, level_regions):
     for loc_data in SHIP_PIECE_LOCATIONS:
@@ -145,45 +178,22 @@ def add_ship_pieces(world, player, level_regions):
             new_loc.progress_type = LocationProgressType.PRIORITY
             level_regions[loc_data.level].locations.append(new_loc)
 
+# Rank checks also count the points expected from exploring every level reachable so far
 def add_rank_checks(menu: Region, world, player, options: TJEOptions):
+    map_points = cumulative_map_points(options.last_level.value)
     for number, rank in enumerate(RANK_NAMES[1:options.max_rank_check.value+1], start=1):
         loc_name = RANK_LOC_TEMPLATE.format(rank)
         loc = TJELocation(player, loc_name, world.location_name_to_id[loc_name], menu)
-        loc.access_rule = lambda state, rank_num=number: state.has("points", player, world.rank_thresholds[rank_num])
+        loc.access_rule = RankRule(player, world.rank_thresholds[number], map_points)
         loc.progress_type = LocationProgressType.PRIORITY
         forbid_items_for_player(loc, {"Promotion", "Big Points"}, player)
         menu.locations.append(loc) 
 
-def add_reach_level_checks(player, world, options: TJEOptions, level_regions: list[Region]):
-    for i, level in enumerate(level_regions[2:options.last_level.value+1]):
-        loc_name = REACH_LOC_TEMPLATE.format(i+2)
-        level.locations.append(
-            TJELocation(player, loc_name, world.location_name_to_id[loc_name], level)
-        )
-
 def add_mailbox_checks(player, world, options: TJEOptions, level_regions: list[Region]):
     for (n, (i, pos)) in enumerate(product(world.mailbox_levels, MAILBOX_ITEM_REFS)):
         loc_name = MAILBOX_LOC_TEMPLATE.format(i, pos)
-        loc = TJELocation(player, loc_name, world.location_name_to_id[loc_name], level_regions[i])
+        loc = TJEMailboxLocation(player, loc_name, world.location_name_to_id[loc_name], level_regions[i])
         forbid_items_for_player(loc, {"Buck", "Extra Buck Present", "Jackpot"}, player)
         level_regions[i].locations.append(loc)
 
 #endregion
-
-#region Logic-tracking events
-
-def create_event(player: int, event: str, point_value: int = 0, progression = True) -> TJEItem:
-    item = TJEItem(event, ItemClassification.progression_skip_balancing if progression else ItemClassification.filler,
-                    None, player)
-    item.point_value = point_value
-    return item
-
-# Points for exploring the map (values are tentative)
-def add_exploration_points(level: Region, player: int, level_number: int):
-    value = expected_map_points_on_level(level_number)
-    map_loc = TJELocation(player, f"Uncover {value} Map Tiles on Level {level_number}", None, level)
-    map_loc.show_in_spoiler = False
-    map_loc.place_locked_item(create_event(player, f"{value} Points (Map Exploration)", value))
-    level.locations.append(map_loc)
-
-#endregion
@@ -1,21 +1,38 @@
-import struct
+import functools
+import hashlib
 import json
+import logging
+import multiprocessing
+import os
+import struct
 import pkgutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from itertools import chain
 from math import sqrt, ceil
+from random import Random
+from types import SimpleNamespace
+from typing import Iterable, NamedTuple
 
 from settings import get_settings
-from worlds.Files import APProcedurePatch, APTokenMixin, APTokenTypes
-
-from .constants import EMPTY_PRESENT, INITIAL_PRESENT_ADDRS, BASE_LEVEL_TYPES, INV_REF_ADDRS_VANILLA, \
-                       INV_SIZE_ADDRS_VANILLA, INV_SIZE_ADDRS_ASL_D0_VANILLA, INV_SIZE_ADDRS_INITIAL, \
-                       MAP_REVEAL_DIALOGUE_ADDRS, PCM_SFX_ADDRS, PCM_SFX_ADDRS_MUSIC, PCM_SFX_USAGE_ADDRS, \
-                       PCM_SFX_USAGE_ADDRS_MUSIC, PSG_SFX, PSG_SFX_USAGE_ADDRS, SIMPLE_SFX, SIMPLE_SFX_USAGE_ADDRS, \
-                       POINT_PRESENT_NAME, POINT_PRESENT_DIALOGUE_TEMPLATE, TOTAL_PRES_TYPES_PLUS_ONE_ADDRS
-from .generators import map_reveal_text, to_inventory_name, to_mailbox_name
-from .items import ITEM_ID_TO_CODE
-from .options import CharacterOption, SoundRandoOption, StartingPresentOption, GameOverOption, MapRandomizationOption, \
-                     LocalShipPiecesOption
+from Utils import cache_path, parse_yaml
+from worlds.Files import APPatchExtension, APProcedurePatch, APTokenMixin, APTokenTypes
+
+from .assets import get_dro, get_option_patches
+from .constants import EMPTY_PRESENT, INITIAL_PRESENT_ADDRS, BASE_LEVEL_TYPES, MAP_REVEAL_DIALOGUE_ADDRS, \
+                       PCM_SFX_ADDRS, PCM_SFX_ADDRS_MUSIC, PCM_SFX_USAGE_ADDRS, PCM_SFX_USAGE_ADDRS_MUSIC, PSG_SFX, \
+                       PSG_SFX_USAGE_ADDRS, SIMPLE_SFX, SIMPLE_SFX_USAGE_ADDRS, POINT_PRESENT_NAME, \
+                       POINT_PRESENT_DIALOGUE_TEMPLATE, PRESENT_SPRITE_TABLE, PRESENT_TIMER_ADDRS, REV00_MD5, REV02_MD5, \
+                       REPLACEABLE_PRESENT_SPRITES, UNUSED_PRESENT_SPRITES, WALK_SPEED_ADDRS
+from .generators import map_reveal_text, to_inventory_name, to_mailbox_name, shorten_item_name, \
+                        MAILBOX_ITEM_NAME_LENGTH
+from .items import ITEM_ID_TO_CODE, ExtraItemCode
+from .locations import FLOOR_TABLE_STRIDE, FLOOR_ITEM_TABLE_OFFSETS, MAILBOX_ITEM_SLOTS
+from .tokens import Token, apply_tokens, coalesce_tokens, find_overlaps, merge_spans, parse_token_binary, token_span
+from .options import CharacterOption, SoundRandoOption, StartingPresentOption, MapRandomizationOption, TJEOptions
+
+# Recorded in each patch's procedure so a cached base ROM is only reused by the world version that made it
+WORLD_VERSION = json.loads(pkgutil.get_data(__name__, "archipelago.json"))["world_version"]
 
 class TJEProcedurePatch(APProcedurePatch, APTokenMixin):
     game = "ToeJam and Earl"
@@ -23,8 +40,9 @@ class TJEProcedurePatch(APProcedurePatch, APTokenMixin):
     result_file_ending = ".bin"
 
     procedure = [
-        ("apply_bsdiff4", ["base_patch.bsdiff4"]),
-        ("apply_tokens", ["token_data.bin"])
+        ("apply_base_patches", [WORLD_VERSION, "base_patch.bsdiff4"]),
+        ("apply_tokens", ["token_data.bin"]),
+        ("apply_cosmetics", ["cosmetics.json", "cosmetic_data.bin"])
     ]
 
     @classmethod
@@ -35,15 +53,261 @@ class TJEProcedurePatch(APProcedurePatch, APTokenMixin):
 
         return base_rom_bytes
 
-def read_bin(filename: str, sprite: bool = False) -> bytes | None:
-    dir = "data/sprites_bin/" if sprite else "data/asm_bin/"
-    return pkgutil.get_data(__name__, dir + filename + ".bin")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.override_tokens: set[int] = set()
+
+    # For a write meant to land inside an earlier one, e.g. a value in a code blob; any other overlapping write
+    # with different bytes is rejected when the tokens are coalesced
+    def write_override_token(self, token_type: APTokenTypes, offset: int, data: bytes) -> None:
+        self.override_tokens.add(len(self._tokens))
+        self.write_token(token_type, offset, data)
+
+    def get_token_binary(self) -> bytes:
+        self._tokens = coalesce_tokens(self._tokens, self.override_tokens)
+        self.override_tokens = set()
+        return super().get_token_binary()
+
+class TJEPatchExtensions(APPatchExtension):
+    game = "ToeJam and Earl"
+
+    # Same as applying each bsdiff4 file in turn, but the result only depends on the source ROM and the world
+    # version, so it is kept in the user cache and every later seed starts from it
+    @staticmethod
+    def apply_base_patches(caller: APProcedurePatch, rom: bytes, world_version: str, *patch_files: str) -> bytes:
+        payloads = [resolve_base_patch(caller, name) for name in patch_files]
+        payload_hash = hashlib.md5(b"".join(payloads)).hexdigest()[:16]
+        cache_dir = cache_path("tje", "base_roms")
+        cached_path = os.path.join(cache_dir, f"{world_version}-{hashlib.md5(rom).hexdigest()}-{payload_hash}.bin")
+        if os.path.isfile(cached_path):
+            with open(cached_path, "rb") as f:
+                rom = f.read()
+            try:
+                os.utime(cached_path) # Marks it recently used, for pruning
+            except OSError:
+                pass
+            return rom
+
+        import bsdiff4
+        for payload in payloads:
+            rom = bsdiff4.patch(rom, payload)
+
+        # Written under a temporary name first so a concurrent or interrupted patch never sees a partial ROM
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{cached_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(rom)
+            os.replace(temp_path, cached_path)
+            prune_base_rom_cache(cache_dir)
+        except OSError as e:
+            logging.warning(f"Could not cache the patched base ROM: {e}")
+        return rom
+
+    # The cosmetic tokens chosen at generation, or new ones from the local cosmetic overrides if there are any
+    @staticmethod
+    def apply_cosmetics(caller: APProcedurePatch, rom: bytes, manifest_file: str, tokens_file: str) -> bytes:
+        manifest = json.loads(caller.get_file(manifest_file))
+        overrides = read_cosmetic_overrides()
+        if overrides and manifest["world_version"] != WORLD_VERSION:
+            logging.warning(f"Ignoring cosmetic overrides: this patch was made by version {manifest['world_version']} "
+                            f"of the ToeJam & Earl world, not the installed {WORLD_VERSION}")
+            overrides = {}
+
+        if overrides:
+            tokens = cosmetic_tokens(TJECosmetics.from_manifest(manifest, overrides))
+        else:
+            tokens = parse_token_binary(caller.get_file(tokens_file))
+        rom = bytearray(rom)
+        apply_tokens(rom, tokens)
+        return bytes(rom)
+
+# Enough for a few world versions and both ROM revisions to be patched in turn without evicting each other
+BASE_ROM_CACHE_SIZE = 8
+
+# Keeps the most recently used base ROMs, whichever world version they belong to
+def prune_base_rom_cache(cache_dir: str) -> None:
+    paths = [entry.path for entry in os.scandir(cache_dir) if entry.name.endswith(".bin")]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[BASE_ROM_CACHE_SIZE:]:
+        os.remove(path)
+
+# Name of the file listing the sha256 of each base patch payload left out of the container
+BASE_PATCH_REFS = "base_patch_refs.json"
+
+@functools.cache
+def base_patch_payload(name: str) -> bytes:
+    return pkgutil.get_data(__name__, f"data/{name}")
+
+@functools.cache
+def base_patch_sha256(name: str) -> str:
+    return hashlib.sha256(base_patch_payload(name)).hexdigest()
+
+# Payloads referenced by hash come from the installed world's data/, and only when the hash matches. Referenced
+# payloads are never embedded as well, so there is nothing to fall back to
+def resolve_base_patch(caller: APProcedurePatch, name: str) -> bytes:
+    refs = json.loads(caller.files[BASE_PATCH_REFS]) if BASE_PATCH_REFS in caller.files else {}
+    if name not in refs:
+        return caller.get_file(name)
+
+    try:
+        if base_patch_sha256(name) == refs[name]:
+            return base_patch_payload(name)
+    except OSError:
+        pass
+    raise ValueError(f"This patch needs the {name} from a different version of the ToeJam & Earl world than the one "
+                     f"installed (sha256 {refs[name]}); install the version it was generated with")
+
+#region Patch inputs
+
+# Options read by the patching sections
+PATCH_OPTIONS = ("auto_bad_presents", "auto_buck_presents", "auto_point_presents", "character", "death_link",
+                 "earthling_rando", "elevator_keys", "expanded_inventory", "fast_loads", "free_earthling_services",
+                 "game_overs", "islandless", "key_gap", "last_level", "lemonade_check", "local_ship_pieces",
+                 "mailbox_checks", "map_rando", "max_items", "max_rank_check", "min_items", "point_presents",
+                 "present_timers", "sleep_when_idle", "sound_rando", "starting_presents", "unused_present_sprites",
+                 "upwarp_present", "walk_speed")
+# Written next to each patch file, so regenerate.py can rebuild it without generating again
+PATCH_DATA_FILE_ENDING = "_patch_data.json"
+
+# Everything the patching sections need from a world, small enough to send to another process.
+# Attribute names match TJEWorld's, so the patch_* functions take either; randomness comes from the world's
+# patch seed rather than its main RNG, so the patch is the same whichever process builds it
+@dataclass
+class TJEPatchInputs:
+    player: int
+    player_name: str
+    output_path: str
+    rev00: bool
+    reference_base_patches: bool
+    patch_random_seed: int
+    options: SimpleNamespace
+    seeds: list[int]
+    ship_item_levels: list[int]
+    key_levels: list[int]
+    mailbox_levels: list[int]
+    starting_presents: list[int]
+    earthling_list: list[list[int]]
+    map_reveal_potencies: list[int]
+    rank_thresholds: list[int]
+    point_present_value: int
+    patchable_item_list: bytes
+    mailbox_item_names: bytes
+    mailbox_item_types: bytes
+    mailbox_price_table: bytes
+    random: Random = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.random = Random(self.patch_random_seed)
+
+class PatchTables(NamedTuple):
+    patchable_item_list: bytearray
+    mailbox_item_names: bytearray
+    mailbox_item_types: bytearray
+    mailbox_price_table: bytearray
+
+def item_to_tje_hex(player: int, item_code: int | None, item_player: int, advancement: bool) -> int:
+    if item_player == player:
+        return ITEM_ID_TO_CODE.get(item_code, 0xFF)
+    else:
+        return ExtraItemCode.AP_ITEM_PROG if advancement else ExtraItemCode.AP_ITEM
+
+# Fills every per-location patch table in a single pass over a slot's placements, each given as
+# (location id, item id, item player, item name, advancement), so it works from a live world or saved multidata
+def build_patch_tables(player: int, last_level: int, mailbox_levels: list[int], mailbox_prices: list[int],
+                       placements: Iterable[tuple[int, int | None, int, str, bool]]) -> PatchTables:
+    patchable_item_list = bytearray(b"\xFF"*(last_level+1)*FLOOR_TABLE_STRIDE)
+
+    num_mailbox_items = 3*len(mailbox_levels)
+    mailbox_starts = {level: 3*n for n, level in enumerate(mailbox_levels)}
+    record_size = MAILBOX_ITEM_NAME_LENGTH+1
+    mailbox_item_names = bytearray(num_mailbox_items*record_size)
+    mailbox_item_types = bytearray(num_mailbox_items)
+    mailbox_price_table = bytearray(mailbox_prices)
+
+    for location_id, item_code, item_player, item_name, advancement in placements:
+        offset = FLOOR_ITEM_TABLE_OFFSETS.get(location_id)
+        if offset is not None:
+            patchable_item_list[offset] = item_to_tje_hex(player, item_code, item_player, advancement)
+        elif location_id in MAILBOX_ITEM_SLOTS:
+            level, pos = MAILBOX_ITEM_SLOTS[location_id]
+            n = mailbox_starts[level] + pos
+            mailbox_item_names[n*record_size:n*record_size+MAILBOX_ITEM_NAME_LENGTH] = \
+                shorten_item_name(item_name).encode("ascii")
+            mailbox_item_types[n] = item_to_tje_hex(player, item_code, item_player, advancement)
+    return PatchTables(patchable_item_list, mailbox_item_names, mailbox_item_types, mailbox_price_table)
+
+def rom_is_rev00(rom_file: str) -> bool:
+    with open(rom_file, "rb") as f:
+        header_part = f.read(0x18e)
+    return header_part[0x18c:0x18e].decode("ascii") == "00"
+
+def build_patch_file(inputs: TJEPatchInputs) -> str:
+    patch = TJEProcedurePatch(player=inputs.player, player_name=inputs.player_name)
+
+    # Apply REV00 → REV02 upgrade patch if required
+    if inputs.rev00:
+        patch.hash = REV00_MD5
+        base_patches = ["00to02.bsdiff4", "base_patch.bsdiff4"]
+        patch.procedure = [("apply_base_patches", [WORLD_VERSION, *base_patches]),
+                           ("apply_tokens", ["token_data.bin"]),
+                           ("apply_cosmetics", ["cosmetics.json", "cosmetic_data.bin"])]
+    else:
+        patch.hash = REV02_MD5
+        base_patches = ["base_patch.bsdiff4"]
 
-def read_json(filename: str) -> str | None:
-    return pkgutil.get_data(__name__, "data/json/" + filename + ".json").decode("utf-8")
+    if inputs.reference_base_patches:
+        refs = {name: base_patch_sha256(name) for name in base_patches}
+        patch.write_file(BASE_PATCH_REFS, json.dumps(refs).encode("utf-8"))
+    else:
+        for name in base_patches:
+            patch.write_file(name, base_patch_payload(name))
+    write_tokens(inputs, patch)
+    patch.write(inputs.output_path)
+    return inputs.output_path
+
+# In parallel when there are several patches and workers, falling back to building them one at a time. Daemonic
+# processes (e.g. WebHost generation workers) can't have children, and workers are spawned rather than forked since
+# generation output runs alongside other threads
+def build_patch_files(inputs: list[TJEPatchInputs], workers: int) -> list[str]:
+    workers = min(workers or os.cpu_count() or 1, len(inputs))
+    if workers > 1 and not multiprocessing.current_process().daemon:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                return list(executor.map(build_patch_file, inputs))
+        except Exception as e:
+            logging.warning(f"Parallel TJE patch generation failed ({e!r}); building patches serially")
+    return [build_patch_file(patch_inputs) for patch_inputs in inputs]
+
+#endregion
 
 #region Individual patching sections
 
+# Option values the manifest names as strings or booleans, as the option's numeric values
+def resolve_conditions(conditions: dict) -> tuple[tuple[str, frozenset[int]], ...]:
+    resolved = []
+    for name, values in conditions.items():
+        option = TJEOptions.type_hints[name]
+        values = values if isinstance(values, list) else [values]
+        resolved.append((name, frozenset(option.options[v] if isinstance(v, str) else int(v) for v in values)))
+    return tuple(resolved)
+
+@functools.cache
+def option_patch_table() -> tuple[tuple[tuple, tuple, list[Token], frozenset[int]], ...]:
+    return tuple((resolve_conditions(when), resolve_conditions(unless), parse_token_binary(tokens), frozenset(overrides))
+                 for when, unless, tokens, overrides in get_option_patches())
+
+# Everything that depends only on option values, precompiled from tools/asm/optional_patches.json5
+def patch_option_blobs(world, patch, dro) -> None:
+    for when, unless, tokens, overrides in option_patch_table():
+        if all(getattr(world.options, name).value in values for name, values in when) and \
+           not any(getattr(world.options, name).value in values for name, values in unless):
+            for n, token in enumerate(tokens):
+                if n in overrides:
+                    patch.write_override_token(*token)
+                else:
+                    patch.write_token(*token)
+
 def patch_slot_data(world, patch, dro) -> None:
     patch.write_token(APTokenTypes.WRITE, 0x00097704, struct.pack(">26H", *world.seeds))
     patch.write_token(APTokenTypes.WRITE, 0x00097738, struct.pack(">10B", *world.ship_item_levels))
@@ -72,55 +336,31 @@ def patch_slot_data(world, patch, dro) -> None:
         patch.write_token(APTokenTypes.WRITE, 0x001f0030, struct.pack(f">{num_mailbox_levels}B", *world.mailbox_levels))
 
 def patch_item_list(world, patch, dro) -> None:
-    patch.write_token(APTokenTypes.WRITE, 0x001a0000, struct.pack(f">{(world.options.last_level.value+1)*28}B",
-                                                                  *world.patchable_item_list))
+    patch.write_token(APTokenTypes.WRITE, 0x001a0000, bytes(world.patchable_item_list))
 def patch_mailboxes(world, patch, dro) -> None:
     if world.options.mailbox_checks:
-        patch.write_token(APTokenTypes.WRITE, 0x00008e54, read_bin("mailbox_getitemsprices"))
-        patch.write_token(APTokenTypes.WRITE, 0x0000a6c0, read_bin("mailbox_render_items_jump"))
-        patch.write_token(APTokenTypes.WRITE, 0x0010cd00, read_bin("mailbox_render_items"))
-        patch.write_token(APTokenTypes.WRITE, 0x00009bf6, read_bin("mailbox_order_item"))
-
         num_mailbox_levels = len(world.mailbox_levels)
-        patch.write_token(APTokenTypes.WRITE, 0x001a1000, b"".join(world.mailbox_item_names))
-        patch.write_token(APTokenTypes.WRITE, 0x001a2000, struct.pack(f">{3*num_mailbox_levels}B",
-                                                                    *world.mailbox_item_types))
-        patch.write_token(APTokenTypes.WRITE, 0x001a2100, struct.pack(f">{3*num_mailbox_levels}B",
-                                                                    *world.mailbox_item_prices))
+        patch.write_token(APTokenTypes.WRITE, 0x001a1000, bytes(world.mailbox_item_names))
+        patch.write_token(APTokenTypes.WRITE, 0x001a2000, bytes(world.mailbox_item_types))
+        patch.write_token(APTokenTypes.WRITE, 0x001a2100, bytes(world.mailbox_price_table))
 
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010b400 + dro["init_extra"]["num_mailbox_items"] + 3,
-                          struct.pack(">B", num_mailbox_levels*3))
+        patch.write_override_token(APTokenTypes.WRITE,
+                                   0x0010b400 + dro["init_extra"]["num_mailbox_items"] + 3,
+                                   struct.pack(">B", num_mailbox_levels*3))
 
 def patch_main_menu(world, patch, dro) -> None:
-    # Menu return options: 0 for 2-player, 1 for TJ only, 2 for Earl only
+    # The menu itself is patched by the option patches; only the starting character is left
     match world.options.character:
         case CharacterOption.TOEJAM:
-            ret_val = 1
             char_init = 0
-            menu_string_fn = "who_menu_toejam_string"
-            no_2player = True
         case CharacterOption.EARL:
-            ret_val = 2
             char_init = 1
-            menu_string_fn = "who_menu_earl_string"
-            no_2player = True
         case CharacterOption.BOTH:
-            ret_val = 0
             char_init = world.random.randint(0, 1)
-            menu_string_fn = None
-            no_2player = False
 
-    patch.write_token(APTokenTypes.WRITE,
-                      0x0010b400 + dro["init_extra"]["player_char"] + 3,
-                      struct.pack(">B", char_init))
-
-    if menu_string_fn:
-        patch.write_token(APTokenTypes.WRITE, 0x000242c5, struct.pack(">B", ret_val))
-        patch.write_token(APTokenTypes.WRITE, 0x000242d6, read_bin(menu_string_fn))
-
-    if no_2player:
-        patch.write_token(APTokenTypes.WRITE, 0x00011218, read_bin("main_loop_disable_coop_join"))
+    patch.write_override_token(APTokenTypes.WRITE,
+                               0x0010b400 + dro["init_extra"]["player_char"] + 3,
+                               struct.pack(">B", char_init))
 
 def patch_starting_presents(world, patch, dro) -> None:
     if world.options.starting_presents == StartingPresentOption.NONE:
@@ -131,203 +371,38 @@ def patch_starting_presents(world, patch, dro) -> None:
     for i in range(8):
         patch.write_token(APTokenTypes.WRITE, INITIAL_PRESENT_ADDRS[i], presents[i])
 
-def patch_unused_present_sprites(world, patch, dro) -> None:
-    # if we have custom presents enabled, use as many of the unused present sprites as needed for those
-    unused = [0x000aaee4, 0x000aaf92]
-    world.random.shuffle(unused)
-    if world.options.point_presents:
-        patch.write_token(APTokenTypes.WRITE,
-                          0x00106000 + dro["present_sprite_table"]["custom_present_1"],
-                          struct.pack(">L", unused.pop()))
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010a900 + dro["init_id_presents"]["total_pres_types"] + 1,
-                          b"\x1C")
-
-    # randomly replace existing present sprites with the leftover ones
-    if world.options.unused_present_sprites:
-        exclusions = world.random.sample(range(0, 30), k=len(unused))
-        for excl in exclusions:
-            if excl < 26: # do not overwrite Mystery Present or Bonus Hitops sprites
-                patch.write_token(APTokenTypes.WRITE, 0x00106000 + 4*excl, struct.pack(">L", unused.pop()))
-
-def patch_expanded_inv(world, patch, dro) -> None:
-    if world.options.expanded_inventory:
-        inv_ref_addrs = INV_REF_ADDRS_VANILLA.copy()
-        inv_size_addrs = INV_SIZE_ADDRS_VANILLA.copy()
-        inv_size_addrs_asl_d0 = INV_SIZE_ADDRS_ASL_D0_VANILLA.copy()
-
-        # The mailbox item-ordering code does not check inventory (AP client awards items instead),
-        # so these are only required if mailbox checks are disabled
-        if not world.options.mailbox_checks:
-            inv_ref_addrs.extend([0x00009c10+2, 0x00009c98+2])
-            inv_size_addrs.extend([0x00009c04+3, 0x00009c34+3, 0x00009ce0+3])
-            inv_size_addrs_asl_d0.extend([0x00009c0e, 0x00009c96])
-
-        if world.options.max_rank_check.value > 0:
-            inv_size_addrs_asl_d0.append(0x0010bb00 + dro["mole_steal_additions"]["inventory_asl"])
-        else:
-            inv_size_addrs_asl_d0.append(0x00022042)
-
-        inv_ref_addrs.append(0x0010a900 + dro["init_id_presents"]["inventory_addr"] + 2)
-        inv_ref_addrs.append(0x0010e000 + dro["initial_player_setup_seed"]["inventory_addr"] + 2)
-
-        inv_size_addrs.extend([
-            0x0010a900 + dro["init_id_presents"]["inventory_size_1"] + 3,
-            0x0010a900 + dro["init_id_presents"]["inventory_size_2"] + 3,
-        ])
-
-        for addr in inv_ref_addrs:
-            patch.write_token(APTokenTypes.WRITE, addr, struct.pack(">L", 0x00fff280))
-        for addr in inv_size_addrs:
-            patch.write_token(APTokenTypes.WRITE, addr, struct.pack(">B", 64))
-        for i, addr in enumerate(INV_SIZE_ADDRS_INITIAL):
-            patch.write_token(APTokenTypes.WRITE, addr, (0x40+i).to_bytes(1))
-        for addr in inv_size_addrs_asl_d0:
-            patch.write_token(APTokenTypes.WRITE, addr, b"\xED\x80")
-
-        patch.write_token(APTokenTypes.WRITE, 0x000099a6, b"\xED\x81") # using D1
-        patch.write_token(APTokenTypes.WRITE, 0x00022068, b"\xED\x82") # using D2
-
-        # Make presents scooch up properly on opening and dropping (expand range)
-        patch.write_token(APTokenTypes.WRITE, 0x00009ab2+3, b"\x3F")
-        patch.write_token(APTokenTypes.WRITE, 0x00009ba0+3, b"\x3F")
-
-        # Patch menu handler to allow extra scrolling (size/2 - 3)
-        patch.write_token(APTokenTypes.WRITE, 0x0000979c+3, b"\x1D")
-
-def patch_misc_qol(world, patch, dro) -> None:
-    if not world.options.sleep_when_idle:
-        patch.write_token(APTokenTypes.WRITE, 0x0001262a, read_bin("no_idle_sleeping"))
-
-    if world.options.fast_loads:
-        patch.write_token(APTokenTypes.WRITE, 0x0001370e, read_bin("elev_fast_loads"))
-
-    if world.options.free_earthling_services:
-        patch.write_token(APTokenTypes.WRITE, 0x00021a70, read_bin("earthling_opera_free1"))
-        patch.write_token(APTokenTypes.WRITE, 0x00021a8a, read_bin("earthling_opera_free2"))
-        patch.write_token(APTokenTypes.WRITE, 0x00021c04, read_bin("earthling_opera_free_text"))
-        patch.write_token(APTokenTypes.WRITE, 0x000215dc, read_bin("earthling_wizard_free1"))
-        patch.write_token(APTokenTypes.WRITE, 0x000215f4, read_bin("earthling_wizard_free2"))
-        patch.write_token(APTokenTypes.WRITE, 0x000216f2, read_bin("earthling_wizard_free_text"))
-        patch.write_token(APTokenTypes.WRITE, 0x00009d96, read_bin("earthling_wiseman_free1"))
-        patch.write_token(APTokenTypes.WRITE, 0x00009e10, read_bin("earthling_wiseman_free2"))
-        patch.write_token(APTokenTypes.WRITE, 0x000218ea, read_bin("earthling_wiseman_free_text"))
-
-    if world.options.present_timers.value != world.options.present_timers.default:
-        base_timer = ceil(1000*(world.options.present_timers.value/100))
-        hitops_timer = ceil(0.75*base_timer)
-        patch.write_token(APTokenTypes.WRITE, 0x00017334, struct.pack(">H", base_timer))
-        patch.write_token(APTokenTypes.WRITE, 0x00017410, struct.pack(">H", hitops_timer))
-
-    if world.options.walk_speed.value != world.options.walk_speed.default:
-        orthog_land_speed = ceil(320*(world.options.walk_speed.value/100))
-        diag_land_speed = ceil(orthog_land_speed/sqrt(2))
-        patch.write_token(APTokenTypes.WRITE, 0x000f028, struct.pack(">H", orthog_land_speed))
-        patch.write_token(APTokenTypes.WRITE, 0x000f02c, struct.pack(">H", diag_land_speed))
-
-        orthog_road_speed, diag_road_speed = ceil(1.25*orthog_land_speed), ceil(1.25*diag_land_speed)
-        patch.write_token(APTokenTypes.WRITE, 0x000f038, struct.pack(">H", orthog_road_speed))
-        patch.write_token(APTokenTypes.WRITE, 0x000f03c, struct.pack(">H", diag_road_speed))
-
 def patch_point_presents(world, patch, dro) -> None:
     if world.options.point_presents:
-        total_pres_types = 0x1C
-
         pres_name = POINT_PRESENT_NAME.format(world.point_present_value)
         dialogue = POINT_PRESENT_DIALOGUE_TEMPLATE.format(world.point_present_value)
 
-        patch.write_token(APTokenTypes.WRITE, 0x0010d700, read_bin("initial_present_setup"))
-        patch.write_token(APTokenTypes.WRITE, 0x00014302, read_bin("initial_present_setup_jump"))
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010d700 + dro["initial_present_setup"]["total_pres_types"] + 3,
-                          struct.pack(">B", total_pres_types))
-        
-        for addr in TOTAL_PRES_TYPES_PLUS_ONE_ADDRS:
-            patch.write_token(APTokenTypes.WRITE, addr, struct.pack(">B", total_pres_types+1))
-
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010d400 + dro["open_point_present"]["point_present_value_minus_two"] + 2,
-                          struct.pack(">H", world.point_present_value-2))
-        patch.write_token(APTokenTypes.WRITE,
-                          0x00108500 + dro["mailbox_present_name_headers_extra"]["point_present_name"],
-                          to_mailbox_name(pres_name).encode("ascii") + b"\x00")
-        patch.write_token(APTokenTypes.WRITE,
-                          0x00109500 + dro["inv_chars_headers_extra"]["point_present_name"],
-                          struct.pack(">14B", *to_inventory_name(pres_name)))
-        patch.write_token(APTokenTypes.WRITE,
-                          0x00105a00 + dro["dialogue_table_expanded_strings"]["point_present_text"],
-                          dialogue.encode("ascii") + b"\x00")
-        
-
-def patch_upwarp_present(world, patch, dro) -> None:
-    if world.options.upwarp_present:
-        patch.write_token(APTokenTypes.WRITE, 0x00010b06, read_bin("upwarp_handler_jump"))
-        patch.write_token(APTokenTypes.WRITE, 0x0010b900, read_bin("upwarp_handler"))
-        patch.write_token(APTokenTypes.WRITE, 0x000abc34, read_bin("upwarp_name_inv"))
-        patch.write_token(APTokenTypes.WRITE, 0x0000a750, read_bin("upwarp_name_mailbox"))
-        patch.write_token(APTokenTypes.WRITE, 0x00017be6, read_bin("ship_piece_hint_always_show"))
-
-def patch_death_link(world, patch, dro) -> None:
-    if world.options.death_link:
-        patch.write_token(APTokenTypes.WRITE, 0x0000bcc6, read_bin("on_death_jump"))
-        patch.write_token(APTokenTypes.WRITE, 0x0010a400, read_bin("on_death"))
-        if world.options.game_overs != GameOverOption.DROP_DOWN:
-            patch.write_token(APTokenTypes.WRITE,
-                              0x0010a400 + dro["on_death"]["dropdown_life_check"],
-                              read_bin("on_death_remove_life_check"))
-
-def patch_game_overs(world, patch, dro) -> None:
-    if world.options.game_overs == GameOverOption.DISABLE:
-        patch.write_token(APTokenTypes.WRITE, 0x0000bcd0, read_bin("skip_life_subtraction"))
-    elif world.options.game_overs == GameOverOption.DROP_DOWN:
-        patch.write_token(APTokenTypes.WRITE, 0x000111ac, read_bin("dropdown_on_death_jump"))
-        patch.write_token(APTokenTypes.WRITE, 0x0010a300, read_bin("dropdown_on_death"))
-        if not world.options.lemonade_check:
-            patch.write_token(APTokenTypes.WRITE,
-                              0x00111000 + dro["poof_down_with_safety_checks"]["level_1_dropdown_check"],
-                              read_bin("dropdown_on_death_remove_check"))
+        patch.write_override_token(APTokenTypes.WRITE,
+                                   0x0010d400 + dro["open_point_present"]["point_present_value_minus_two"] + 2,
+                                   struct.pack(">H", world.point_present_value-2))
+        patch.write_override_token(APTokenTypes.WRITE,
+                                   0x00108500 + dro["mailbox_present_name_headers_extra"]["point_present_name"],
+                                   to_mailbox_name(pres_name).encode("ascii") + b"\x00")
+        patch.write_override_token(APTokenTypes.WRITE,
+                                   0x00109500 + dro["inv_chars_headers_extra"]["point_present_name"],
+                                   struct.pack(">14B", *to_inventory_name(pres_name)))
+        patch.write_override_token(APTokenTypes.WRITE,
+                                   0x00105a00 + dro["dialogue_table_expanded_strings"]["point_present_text"],
+                                   dialogue.encode("ascii") + b"\x00")
 
 def patch_ranks(world, patch, dro) -> None:
     if world.options.max_rank_check.value > 0:
         patch.write_token(APTokenTypes.WRITE, 0x001a0310, struct.pack(">8H", *world.rank_thresholds[1:]))
-        patch.write_token(APTokenTypes.WRITE, 0x0000b898, read_bin("scaled_rank_points_handler"))
-
-def patch_moles(world, patch, dro) -> None:
-    patch.write_token(APTokenTypes.WRITE, 0x0002203e, read_bin("mole_steal_additions_jump"))
-    patch.write_token(APTokenTypes.WRITE, 0x0010bb00, read_bin("mole_steal_additions"))
-
-    # By default, the mole code includes all failsafes, so we remove unnecessary ones here
-    if world.options.max_rank_check.value == 0:
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010bb00 + dro["mole_steal_additions"]["promotion_present_steal"],
-                          read_bin("mole_steal_additions_remove_check"))
-
-    if world.options.max_rank_check.value == 0 or not world.options.point_presents:
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010bb00 + dro["mole_steal_additions"]["point_present_steal"],
-                          read_bin("mole_steal_additions_remove_check"))
-
-    if not world.options.mailbox_checks:
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010bb00 + dro["mole_steal_additions"]["buck_present_steal"],
-                          read_bin("mole_steal_additions_remove_check"))
-        patch.write_token(APTokenTypes.WRITE,
-                          0x0010bb00 + dro["mole_steal_additions"]["jackpot_present_steal"],
-                          read_bin("mole_steal_additions_remove_check"))
-
-def patch_level_gen(world, patch, dro) -> None:
-    if world.options.islandless:
-        patch.write_token(APTokenTypes.WRITE, 0x00003e80, read_bin("level_gen_islandless"))
 
 def patch_last_level(world, patch, dro) -> None:
     if world.options.last_level != world.options.last_level.default:
         for addr in (0x0010bd00 + dro["elev_key_logic"]["last_level_minus_one"] + 3,
                      0x0010b900 + dro["upwarp_handler"]["last_level_minus_one"] + 1):
-            patch.write_token(APTokenTypes.WRITE, addr, struct.pack(">B", world.options.last_level.value-1))
-        for addr in (0x000127e0+3, 0x0010bf20+3,
-                     0x0010b900 + dro["upwarp_handler"]["last_level"] + 1,
-                     0x0010a700 + dro["ship_piece_touch"]["last_level"] + 1):
+            patch.write_override_token(APTokenTypes.WRITE, addr, struct.pack(">B", world.options.last_level.value-1))
+        for addr in (0x000127e0+3, 0x0010bf20+3):
             patch.write_token(APTokenTypes.WRITE, addr, struct.pack(">B", world.options.last_level.value))
+        for addr in (0x0010b900 + dro["upwarp_handler"]["last_level"] + 1,
+                     0x0010a700 + dro["ship_piece_touch"]["last_level"] + 1):
+            patch.write_override_token(APTokenTypes.WRITE, addr, struct.pack(">B", world.options.last_level.value))
 
 def patch_map_reveals(world, patch, dro) -> None:
     patch.write_token(APTokenTypes.WRITE, 0x001a0300, struct.pack(">5B", *world.map_reveal_potencies))
@@ -349,123 +424,245 @@ def patch_earthling_rando(world, patch, dro) -> None:
     if world.options.earthling_rando != world.options.earthling_rando.default:
         patch.write_token(APTokenTypes.WRITE, 0x0002646e, struct.pack(f">480B", *chain(*world.earthling_list)))
 
-def patch_sound_rando(world, patch, dro) -> None:
-    if world.options.sound_rando != world.options.sound_rando.default:
-        # Get base of static PCM/PSG locations
-        if world.options.sound_rando == SoundRandoOption.ALL:
-            pcm_sfx_addrs = PCM_SFX_ADDRS + PCM_SFX_ADDRS_MUSIC
-            pcm_sfx_usage_addrs = PCM_SFX_USAGE_ADDRS + PCM_SFX_USAGE_ADDRS_MUSIC
-        else:
-            pcm_sfx_addrs = PCM_SFX_ADDRS
-            pcm_sfx_usage_addrs = PCM_SFX_USAGE_ADDRS
-        
-        psg_sfx_usage_addrs = PSG_SFX_USAGE_ADDRS.copy()
-        if world.options.mailbox_checks:
-            psg_sfx_usage_addrs[18].extend([0x00009bf6 + dro["mailbox_order_item"]["PSG_SFX_1"],
-                                           0x00009bf6 + dro["mailbox_order_item"]["PSG_SFX_2"]])
-        else:
-            psg_sfx_usage_addrs[18].append(0x00009cd4)
+def patch_map_rando(world, patch, dro) -> None:
+    # Full random and mapsanity are entirely covered by the option patches
+    match world.options.map_rando:
+        case MapRandomizationOption.BASE_SHUFFLE:
+            level_types = list(BASE_LEVEL_TYPES)
+            world.random.shuffle(level_types)
+        case MapRandomizationOption.BASE_RANDOM:
+            level_types = world.random.choices(range(8), k=24)
+        case _:
+            return
+    patch.write_token(APTokenTypes.WRITE, 0x0008c00e, struct.pack(">24B", *level_types))
 
-        # Insert dynamic locations from DRO list
-        psg_sfx_usage_addrs[11].append(0x0010c300 + dro["bad_food_damage"]["PSG_SFX"])
-        psg_sfx_usage_addrs[0] = (0x0010a100 + dro["pickup_item_autoid"]["PSG_SFX"],
-                                  0x0010a000 + dro["pickup_ground_item"]["PSG_SFX"])
+#endregion
 
-        world.random.shuffle(pcm_sfx_addrs)
-        for i, sfx_addr in enumerate(pcm_sfx_addrs):
-            for rom_addr in pcm_sfx_usage_addrs[i]:
-                patch.write_token(APTokenTypes.WRITE, rom_addr + 2, struct.pack(">L", sfx_addr))
+#region Cosmetic sections
 
-        world.random.shuffle(PSG_SFX)
-        for i, sfx_num in enumerate(PSG_SFX):
-            for rom_addr in psg_sfx_usage_addrs[i]:
-                patch.write_token(APTokenTypes.WRITE, rom_addr + 3, struct.pack(">B", sfx_num))
+# Options that only change how the game looks, sounds or feels. Their sections run after all the others, from
+# their own RNG, so they can be re-rolled on an already patched ROM (see cosmetics.py) without touching the rest
+COSMETIC_OPTIONS = ("present_timers", "sound_rando", "unused_present_sprites", "walk_speed")
+# Also read by the cosmetic sections, but fixed by the seed
+COSMETIC_CONTEXT_OPTIONS = ("mailbox_checks", "point_presents")
+COSMETICS_FILE, COSMETIC_TOKENS_FILE = "cosmetics.json", "cosmetic_data.bin"
 
-        world.random.shuffle(SIMPLE_SFX)
-        for i, sfx_num in enumerate(SIMPLE_SFX):
-            for rom_addr in SIMPLE_SFX_USAGE_ADDRS[i]:
-                patch.write_token(APTokenTypes.WRITE, rom_addr + 3, struct.pack(">B", sfx_num))
+@dataclass
+class TJECosmetics:
+    seed: int
+    options: SimpleNamespace
+    random: Random = field(init=False, repr=False)
 
-def patch_map_rando(world, patch, dro) -> None:
-    if world.options.map_rando != world.options.map_rando.default:
-        level_types, new_params = None, None
-
-        match world.options.map_rando:
-            case MapRandomizationOption.BASE_SHUFFLE:
-                add_failsafe = True
-                level_types = BASE_LEVEL_TYPES
-                world.random.shuffle(level_types)
-            case MapRandomizationOption.BASE_RANDOM:
-                add_failsafe = True
-                level_types = world.random.choices(range(8), k=24)
-            case MapRandomizationOption.FULL_RANDOM | MapRandomizationOption.MAPSANITY:
-                add_failsafe = False
-                new_params = read_bin("level_gen_mapsanity_parameter_ranges")
-                level_types = [0]*24
-
-        if level_types:
-            patch.write_token(APTokenTypes.WRITE, 0x0008c00e, struct.pack(">24B", *level_types))
-        if new_params:
-            patch.write_token(APTokenTypes.WRITE, 0x0008beca, new_params)
-        if add_failsafe:
-            for addr in [0x0008bef6, 0x0008bf06, 0x0008bf16, 0x0008bf26, 0x0008bf36, 0x0008bf46]:
-                patch.write_token(APTokenTypes.WRITE, addr, read_bin("level_gen_parameter_failsafe"))
-
-        if world.options.map_rando == MapRandomizationOption.MAPSANITY:
-            patch.write_token(APTokenTypes.WRITE, 0x00004a4c, read_bin("level_gen_skip_seed_setting"))
-            patch.write_token(APTokenTypes.WRITE, 0x00004506, read_bin("level_gen_skip_mapdata_storage"))
-
-def patch_ship_piece_sprites(world, patch, dro) -> None:
-    if world.options.local_ship_pieces != LocalShipPiecesOption.VANILLA:
-        for addr in (0x000e13fd, 0x000e1407, 0x000e1411):
-            patch.write_token(APTokenTypes.WRITE, addr, read_bin("ship_piece_hint_spr_flags"))
-        patch.write_token(APTokenTypes.WRITE, 0x000e13fe, read_bin("ship_piece_hint_spr_pointer1"))
-        patch.write_token(APTokenTypes.WRITE, 0x000e1408, read_bin("ship_piece_hint_spr_pointer2"))
-        patch.write_token(APTokenTypes.WRITE, 0x000e1412, read_bin("ship_piece_hint_spr_pointer3"))
-
-        for addr in (0x000e0e81, 0x000e0e8b, 0x000e116d, 0x000e1177):
-            patch.write_token(APTokenTypes.WRITE, addr, read_bin("ship_piece_sign_plinth_spr_flags"))
-        patch.write_token(APTokenTypes.WRITE, 0x000e0e82, read_bin("ship_piece_sign_plinth_spr_pointer1"))
-        patch.write_token(APTokenTypes.WRITE, 0x000e0e8c, read_bin("ship_piece_sign_plinth_spr_pointer2"))
-        patch.write_token(APTokenTypes.WRITE, 0x000e116e, read_bin("ship_piece_sign_plinth_spr_pointer3"))
-        patch.write_token(APTokenTypes.WRITE, 0x000e1178, read_bin("ship_piece_sign_plinth_spr_pointer4"))
-
-        for addr, spr_file in zip((0x00100120, 0x00100320, 0x00100520),
-                                  ("apitemhere0", "apitemhere1", "apitemhere2")):
-            patch.write_token(APTokenTypes.WRITE, addr, read_bin(spr_file, sprite = True))
-
-        for addr, spr_file in zip((0x00100720, 0x00100920, 0x00100b20, 0x00100d20),
-                                  ("shippiece0tile0", "shippiece0tile1", "shippiece1tile0", "shippiece1tile1")):
-            patch.write_token(APTokenTypes.WRITE, addr, read_bin(spr_file, sprite = True))
-        
-        patch.write_token(APTokenTypes.WRITE, 0x000205e8, read_bin("ship_piece_strings"))
+    def __post_init__(self):
+        self.random = Random(f"cosmetics-{self.seed}")
 
-#endregion
+    @classmethod
+    def from_world(cls, world: "TJEWorld | TJEPatchInputs") -> "TJECosmetics":
+        return cls(world.patch_random_seed,
+                   SimpleNamespace(**{name: getattr(world.options, name)
+                                      for name in COSMETIC_OPTIONS + COSMETIC_CONTEXT_OPTIONS}))
 
-def write_tokens(world: "TJEWorld", patch: TJEProcedurePatch) -> None:
-    dro = json.loads(read_json("dynamic_repatch_offsets"))
-
-    patch_slot_data(world, patch, dro)
-    patch_item_list(world, patch, dro)
-    patch_mailboxes(world, patch, dro)
-    patch_main_menu(world, patch, dro)
-    patch_starting_presents(world, patch, dro)
-    patch_expanded_inv(world, patch, dro)
-    patch_misc_qol(world, patch, dro)
-    patch_point_presents(world, patch, dro)
-    patch_unused_present_sprites(world, patch, dro)
-    patch_upwarp_present(world, patch, dro)
-    patch_death_link(world, patch, dro)
-    patch_game_overs(world, patch, dro)
-    patch_ranks(world, patch, dro)
-    patch_moles(world, patch, dro)
-    patch_level_gen(world, patch, dro)
-    patch_min_max_items(world, patch, dro)
-    patch_last_level(world, patch, dro)
-    patch_map_reveals(world, patch, dro)
-    patch_earthling_rando(world, patch, dro)
-    patch_sound_rando(world, patch, dro)
-    patch_map_rando(world, patch, dro)
-    patch_ship_piece_sprites(world, patch, dro)
+    # Overrides may set any of COSMETIC_OPTIONS, as in a player YAML, and "seed" (an integer, or "random")
+    @classmethod
+    def from_manifest(cls, manifest: dict, overrides: dict) -> "TJECosmetics":
+        unknown = set(overrides) - {*COSMETIC_OPTIONS, "seed"}
+        if unknown:
+            raise ValueError(f"Not cosmetic settings: {', '.join(sorted(unknown))}")
+
+        values = manifest["options"] | {name: value for name, value in overrides.items() if name != "seed"}
+        seed = overrides.get("seed", manifest["seed"])
+        if seed == "random":
+            seed = Random().getrandbits(64)
+        return cls(int(seed), SimpleNamespace(**{name: TJEOptions.type_hints[name].from_any(value)
+                                                 for name, value in values.items()}))
+
+    def manifest(self) -> dict:
+        return {
+            "world_version": WORLD_VERSION,
+            "seed": self.seed,
+            "options": {name: option.value for name, option in vars(self.options).items()},
+            "spans": cosmetic_spans(self),
+        }
+
+# Read from the file named by the cosmetic_overrides host setting when no path is given
+def read_cosmetic_overrides(path: str | None = None) -> dict:
+    path = path or get_settings().tje_options.cosmetic_overrides
+    if not path:
+        return {}
+    with open(path, encoding="utf-8-sig") as f:
+        return parse_yaml(f.read()) or {}
+
+def patch_misc_qol(world, patch, dro) -> None:
+    if world.options.present_timers.value != world.options.present_timers.default:
+        base_timer = ceil(1000*(world.options.present_timers.value/100))
+        hitops_timer = ceil(0.75*base_timer)
+        for addr, timer in zip(PRESENT_TIMER_ADDRS, (base_timer, hitops_timer)):
+            patch.write_token(APTokenTypes.WRITE, addr, struct.pack(">H", timer))
+
+    if world.options.walk_speed.value != world.options.walk_speed.default:
+        orthog_land_speed = ceil(320*(world.options.walk_speed.value/100))
+        diag_land_speed = ceil(orthog_land_speed/sqrt(2))
+        orthog_road_speed, diag_road_speed = ceil(1.25*orthog_land_speed), ceil(1.25*diag_land_speed)
+        for addr, speed in zip(WALK_SPEED_ADDRS,
+                               (orthog_land_speed, diag_land_speed, orthog_road_speed, diag_road_speed)):
+            patch.write_token(APTokenTypes.WRITE, addr, struct.pack(">H", speed))
 
+def patch_unused_present_sprites(world, patch, dro) -> None:
+    # if we have custom presents enabled, use as many of the unused present sprites as needed for those
+    unused = list(UNUSED_PRESENT_SPRITES)
+    world.random.shuffle(unused)
+    if world.options.point_presents:
+        patch.write_override_token(APTokenTypes.WRITE,
+                                   PRESENT_SPRITE_TABLE + dro["present_sprite_table"]["custom_present_1"],
+                                   struct.pack(">L", unused.pop()))
+
+    # randomly replace existing present sprites with the leftover ones
+    if world.options.unused_present_sprites:
+        exclusions = world.random.sample(range(0, 30), k=len(unused))
+        for excl in exclusions:
+            if excl < REPLACEABLE_PRESENT_SPRITES: # do not overwrite Mystery Present or Bonus Hitops sprites
+                patch.write_token(APTokenTypes.WRITE, PRESENT_SPRITE_TABLE + 4*excl, struct.pack(">L", unused.pop()))
+
+class SoundUsageTable(NamedTuple):
+    sounds: tuple[bytes, ...] # Encoded operand of each sound slot, in vanilla order
+    targets: tuple[int, ...] # Operand address of each place a sound is played
+    slots: tuple[int, ...] # Sound slot played at each target
+    repatches: frozenset[int] # Targets inside patched-in code blobs rather than vanilla code
+
+def sound_usage_table(sounds: tuple[int, ...], usage_addrs: tuple[tuple[int, ...], ...], operand_offset: int,
+                      operand_format: str, repatch_addrs: Iterable[int] = ()) -> SoundUsageTable:
+    usages = [(addr + operand_offset, slot) for slot, addrs in enumerate(usage_addrs) for addr in addrs]
+    return SoundUsageTable(tuple(struct.pack(operand_format, sound) for sound in sounds),
+                           tuple(target for target, _ in usages), tuple(slot for _, slot in usages),
+                           frozenset(addr + operand_offset for addr in repatch_addrs))
+
+# PCM, PSG and simple sound tables; built once per setting combination and shared by every world
+@functools.cache
+def sound_usage_tables(all_sounds: bool, mailbox_checks: bool) -> tuple[SoundUsageTable, ...]:
+    dro = get_dro()
+    if all_sounds:
+        pcm_sfx_addrs = PCM_SFX_ADDRS + PCM_SFX_ADDRS_MUSIC
+        pcm_sfx_usage_addrs = PCM_SFX_USAGE_ADDRS + PCM_SFX_USAGE_ADDRS_MUSIC
+    else:
+        pcm_sfx_addrs = PCM_SFX_ADDRS
+        pcm_sfx_usage_addrs = PCM_SFX_USAGE_ADDRS
+
+    # Insert dynamic locations from DRO list
+    pickup_addrs = (0x0010a100 + dro["pickup_item_autoid"]["PSG_SFX"],
+                    0x0010a000 + dro["pickup_ground_item"]["PSG_SFX"])
+    bad_food_addrs = (0x0010c300 + dro["bad_food_damage"]["PSG_SFX"],)
+    if mailbox_checks:
+        mailbox_addrs = (0x00009bf6 + dro["mailbox_order_item"]["PSG_SFX_1"],
+                         0x00009bf6 + dro["mailbox_order_item"]["PSG_SFX_2"])
+    else:
+        mailbox_addrs = ()
+    psg_sfx_usage_addrs = list(PSG_SFX_USAGE_ADDRS)
+    psg_sfx_usage_addrs[0] = pickup_addrs
+    psg_sfx_usage_addrs[11] += bad_food_addrs
+    psg_sfx_usage_addrs[18] += mailbox_addrs or (0x00009cd4,)
+    psg_repatch_addrs = pickup_addrs + bad_food_addrs + mailbox_addrs
+
+    return (sound_usage_table(pcm_sfx_addrs, pcm_sfx_usage_addrs, 2, ">L"),
+            sound_usage_table(PSG_SFX, tuple(psg_sfx_usage_addrs), 3, ">B", psg_repatch_addrs),
+            sound_usage_table(SIMPLE_SFX, SIMPLE_SFX_USAGE_ADDRS, 3, ">B"))
+
+def patch_sound_rando(world, patch, dro) -> None:
+    if world.options.sound_rando != world.options.sound_rando.default:
+        for table in sound_usage_tables(world.options.sound_rando == SoundRandoOption.ALL,
+                                        bool(world.options.mailbox_checks)):
+            # Shuffling slot indices draws the same permutation as shuffling the sounds themselves
+            permutation = list(range(len(table.sounds)))
+            world.random.shuffle(permutation)
+            sounds = [table.sounds[slot] for slot in permutation]
+            for target, slot in zip(table.targets, table.slots):
+                if target in table.repatches:
+                    patch.write_override_token(APTokenTypes.WRITE, target, sounds[slot])
+                else:
+                    patch.write_token(APTokenTypes.WRITE, target, sounds[slot])
+
+# Every byte the cosmetic sections can write under any setting, so that a re-roll can put them all back first
+def cosmetic_spans(world) -> list[tuple[int, int]]:
+    spans = [(addr, addr + 2) for addr in PRESENT_TIMER_ADDRS + WALK_SPEED_ADDRS]
+    spans.append((PRESENT_SPRITE_TABLE, PRESENT_SPRITE_TABLE + 4*REPLACEABLE_PRESENT_SPRITES))
+    if world.options.point_presents:
+        custom_present = PRESENT_SPRITE_TABLE + get_dro()["present_sprite_table"]["custom_present_1"]
+        spans.append((custom_present, custom_present + 4))
+    for table in sound_usage_tables(True, bool(world.options.mailbox_checks)):
+        spans.extend((target, target + len(table.sounds[slot])) for target, slot in zip(table.targets, table.slots))
+    return merge_spans(spans)
+
+#endregion
+
+def write_tokens(world: "TJEWorld | TJEPatchInputs", patch: TJEProcedurePatch) -> None:
+    write_patch_sections(world, patch)
     patch.write_file("token_data.bin", patch.get_token_binary())
+
+    # Kept apart, with the settings that produced them, so the patcher can swap in locally overridden ones
+    cosmetics = TJECosmetics.from_world(world)
+    cosmetic_patch = TJEProcedurePatch()
+    write_cosmetic_sections(cosmetics, cosmetic_patch)
+    patch.write_file(COSMETICS_FILE, json.dumps(cosmetics.manifest()).encode("utf-8"))
+    patch.write_file(COSMETIC_TOKENS_FILE, cosmetic_patch.get_token_binary())
+
+# In application order: the option patches come first so that seed-dependent writes can patch values inside them
+PATCH_SECTIONS = (patch_option_blobs, patch_slot_data, patch_item_list, patch_mailboxes, patch_main_menu,
+                  patch_starting_presents, patch_point_presents, patch_ranks, patch_min_max_items, patch_last_level,
+                  patch_map_reveals, patch_earthling_rando, patch_map_rando)
+COSMETIC_SECTIONS = (patch_misc_qol, patch_unused_present_sprites, patch_sound_rando)
+
+def write_patch_sections(world: "TJEWorld | TJEPatchInputs", patch: TJEProcedurePatch) -> None:
+    dro = get_dro()
+    for section in PATCH_SECTIONS:
+        section(world, patch, dro)
+
+def write_cosmetic_sections(cosmetics: TJECosmetics, patch: TJEProcedurePatch) -> None:
+    dro = get_dro()
+    for section in COSMETIC_SECTIONS:
+        section(cosmetics, patch, dro)
+
+def cosmetic_tokens(cosmetics: TJECosmetics) -> list[Token]:
+    patch = TJEProcedurePatch()
+    write_cosmetic_sections(cosmetics, patch)
+    return list(patch._tokens)
+
+#region Verification
+
+class PatchTrace(NamedTuple):
+    tokens: list[Token]
+    sections: list[str] # Name of the patch_* function that wrote each token
+    regions: dict[str, list[tuple[int, int]]] # Disjoint [start, end) regions touched by each section
+    multi_writes: list[tuple[int, int, str, str]] # Overlapping [start, end) and the sections writing each side
+
+# Runs the patching sections without building a patch file, recording which section wrote each token
+def trace_patch_sections(world: "TJEWorld | TJEPatchInputs") -> PatchTrace:
+    patch = TJEProcedurePatch()
+    dro = get_dro()
+    cosmetics = TJECosmetics.from_world(world)
+    sections = []
+    for section in chain(PATCH_SECTIONS, COSMETIC_SECTIONS):
+        count = len(patch._tokens)
+        section(cosmetics if section in COSMETIC_SECTIONS else world, patch, dro)
+        sections.extend([section.__name__] * (len(patch._tokens) - count))
+
+    tokens = list(patch._tokens)
+    spans = [token_span(token) for token in tokens]
+    regions = {}
+    for section in chain(PATCH_SECTIONS, COSMETIC_SECTIONS):
+        section_spans = [span for span, name in zip(spans, sections) if name == section.__name__]
+        if section_spans:
+            regions[section.__name__] = merge_spans(section_spans)
+    multi_writes = [(overlap.start, overlap.end, sections[overlap.first], sections[overlap.second])
+                    for overlap in find_overlaps(spans)]
+    return PatchTrace(tokens, sections, regions, multi_writes)
+
+def format_patch_trace(trace: PatchTrace) -> str:
+    lines = []
+    for name, regions in trace.regions.items():
+        size = sum(end - start for start, end in regions)
+        lines.append(f"{name}: {size} byte(s) in {len(regions)} region(s)")
+    for start, end, first, second in trace.multi_writes:
+        written_by = first if first == second else f"{first}, then {second}"
+        lines.append(f"Written more than once: 0x{start:08x}–0x{end:08x} by {written_by}")
+    return "\n".join(lines)
+
+#endregion
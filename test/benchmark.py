@@ -0,0 +1,314 @@
+"""
+Generation benchmarks for the TJE world. Not collected by the unit test runner.
+
+Run from the root of an Archipelago checkout, e.g.:
+    python -m worlds.tje.test.benchmark stages --players 1 10 100 --output results.json
+    python -m worlds.tje.test.benchmark stages --baseline results.json
+    python -m worlds.tje.test.benchmark fill --players 50
+    python -m worlds.tje.test.benchmark earthlings --repeats 1000
+    python -m worlds.tje.test.benchmark tokens --images 1000 --trace
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import Namespace
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from BaseClasses import CollectionState, MultiWorld
+from Fill import distribute_items_restrictive
+from worlds.AutoWorld import call_all
+
+from .. import TJEWorld
+from ..generators import TJEGenerator
+from ..rom import TJECosmetics, TJEProcedurePatch, format_patch_trace, trace_patch_sections, \
+                   write_cosmetic_sections, write_patch_sections
+from ..tokens import apply_tokens, parse_token_binary, token_span
+
+PRE_FILL_STEPS = ("generate_early", "create_regions", "create_items", "set_rules", "connect_entrances",
+                  "generate_basic", "pre_fill")
+
+# Patching is never benchmarked against a real ROM, so the version must be fixed
+BASE_OPTIONS: dict[str, Any] = {
+    "game_version": "rev02",
+}
+
+FILL_OPTIONS: dict[str, Any] = BASE_OPTIONS | {
+    "mailbox_checks": True,
+    "max_rank_check": 8,
+}
+
+# Each configuration is benchmarked on top of BASE_OPTIONS
+STAGE_CONFIGS: dict[str, dict[str, Any]] = {
+    "default": {},
+    "mailboxes": {"mailbox_checks": True},
+    "ranks": {"max_rank_check": 8},
+    "keys": {"elevator_keys": True, "key_gap": 4},
+    "earthlings": {"earthling_rando": "nice_random"},
+    "maps": {"map_rando": "full_random"},
+    "everything": {"mailbox_checks": True, "max_rank_check": 8, "elevator_keys": True, "key_gap": 4,
+                   "earthling_rando": "nice_random", "map_rando": "full_random"},
+}
+
+def setup_multiworld(num_players: int, seed: int | None = None, options: dict[str, Any] | None = None) -> MultiWorld:
+    options = BASE_OPTIONS | (options or {})
+    multiworld = MultiWorld(num_players)
+    multiworld.game = {player: TJEWorld.game for player in multiworld.player_ids}
+    multiworld.player_name = {player: f"Player{player}" for player in multiworld.player_ids}
+    multiworld.set_seed(seed)
+
+    args = Namespace()
+    for name, option in TJEWorld.options_dataclass.type_hints.items():
+        value = options.get(name, option.default)
+        setattr(args, name, {player: option.from_any(value) for player in multiworld.player_ids})
+    multiworld.set_options(args)
+    multiworld.state = CollectionState(multiworld)
+    return multiworld
+
+def run_steps(multiworld: MultiWorld, steps: tuple[str, ...]) -> None:
+    for step in steps:
+        if hasattr(TJEWorld, step):
+            call_all(multiworld, step)
+
+def fill(multiworld: MultiWorld) -> None:
+    distribute_items_restrictive(multiworld)
+    call_all(multiworld, "post_fill")
+
+def stage_steps(output_dir: str) -> list[tuple[str, Callable[[MultiWorld], Any]]]:
+    steps = [(step, lambda multiworld, step=step: call_all(multiworld, step)) for step in PRE_FILL_STEPS
+             if hasattr(TJEWorld, step)]
+    return steps + [
+        ("fill", fill),
+        ("generate_output", lambda multiworld: call_all(multiworld, "generate_output", output_dir)),
+        ("fill_slot_data", lambda multiworld: call_all(multiworld, "fill_slot_data")),
+    ]
+
+# Wall time, plus the net and peak memory allocated during the stage if tracing (which slows everything down)
+def bench_stages(num_players: int, seed: int, options: dict[str, Any], trace: bool) -> dict[str, dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        multiworld = setup_multiworld(num_players, seed, options)
+        for name, step in stage_steps(output_dir):
+            if trace:
+                tracemalloc.start()
+            start = time.perf_counter()
+            step(multiworld)
+            results[name] = {"time": time.perf_counter() - start}
+            if trace:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results[name] |= {"allocated": current, "peak": peak}
+    return results
+
+def run_stage_suite(player_counts: list[int], configs: list[str], seed: int, trace: bool) -> dict[str, Any]:
+    results = {}
+    for config in configs:
+        for num_players in player_counts:
+            key = f"{config}/{num_players}"
+            results[key] = bench_stages(num_players, seed, STAGE_CONFIGS[config], trace)
+            print(f"{key}: {sum(stage['time'] for stage in results[key].values()):.3f}s")
+    return {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "seed": seed,
+        "traced": trace,
+        "results": results,
+    }
+
+# Prints the ratio of each stage's time (and peak memory) to the baseline's; returns the number of regressions
+def compare_stages(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> int:
+    regressions = 0
+    for key, stages in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        for name, stats in stages.items():
+            old = baseline["results"][key].get(name)
+            if old is None:
+                continue
+            line = []
+            for metric in ("time", "peak"):
+                if metric in stats and old.get(metric):
+                    ratio = stats[metric]/old[metric]
+                    flag = ""
+                    # Very short stages are too noisy to call
+                    if ratio > 1 + threshold and (metric != "time" or stats[metric] > 0.01):
+                        flag = " (regression)"
+                        regressions += 1
+                    line.append(f"{metric} x{ratio:.2f}{flag}")
+            print(f"{key} {name}: " + ", ".join(line))
+    return regressions
+
+def bench_fill(num_players: int, seed: int, repeats: int) -> list[float]:
+    times = []
+    for n in range(repeats):
+        multiworld = setup_multiworld(num_players, seed + n, FILL_OPTIONS)
+        run_steps(multiworld, PRE_FILL_STEPS)
+
+        start = time.perf_counter()
+        distribute_items_restrictive(multiworld)
+        call_all(multiworld, "post_fill")
+        times.append(time.perf_counter() - start)
+    return times
+
+# Peak RSS covers the whole process, so compare runs made in separate processes
+def bench_memory(num_players: int, seed: int) -> tuple[int, int]:
+    import resource # Unix only
+
+    tracemalloc.start()
+    multiworld = setup_multiworld(num_players, seed, FILL_OPTIONS)
+    run_steps(multiworld, PRE_FILL_STEPS)
+    distribute_items_restrictive(multiworld)
+    call_all(multiworld, "post_fill")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on Linux but already in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak, max_rss * 1024 if sys.platform != "darwin" else max_rss
+
+def bench_earthlings(niceness: int, last_level: int, seed: int, repeats: int) -> list[float]:
+    times = []
+    for n in range(repeats):
+        generator = TJEGenerator(SimpleNamespace(random=random.Random(seed + n)))
+        mailbox_levels = generator.random.sample(range(2, last_level+1), k=min(8, last_level-1))
+
+        start = time.perf_counter()
+        generator.generate_nice_random_earthlings(niceness, last_level, mailbox_levels)
+        times.append(time.perf_counter() - start)
+    return times
+
+def bench_item_blob(number: int, seed: int, repeats: int) -> list[float]:
+    times = []
+    for n in range(repeats):
+        generator = TJEGenerator(SimpleNamespace(random=random.Random(seed + n)))
+        generator.enable_point_presents()
+
+        start = time.perf_counter()
+        generator.generate_item_blob(number)
+        times.append(time.perf_counter() - start)
+    return times
+
+def bench_prices(num_mailboxes: int, total_bucks: int, seed: int, repeats: int) -> list[float]:
+    times = []
+    for n in range(repeats):
+        generator = TJEGenerator(SimpleNamespace(random=random.Random(seed + n)))
+
+        start = time.perf_counter()
+        generator.generate_item_prices(num_mailboxes, total_bucks)
+        times.append(time.perf_counter() - start)
+    return times
+
+# Parses one generated seed's token binary and applies it to fresh synthetic ROM images entirely in memory
+def bench_tokens(seed: int, images: int, trace: bool) -> list[float]:
+    multiworld = setup_multiworld(1, seed, FILL_OPTIONS)
+    run_steps(multiworld, PRE_FILL_STEPS)
+    fill(multiworld)
+    inputs = multiworld.worlds[1].patch_inputs("", False)
+    if trace:
+        print(format_patch_trace(trace_patch_sections(inputs)))
+
+    patch = TJEProcedurePatch()
+    write_patch_sections(inputs, patch)
+    write_cosmetic_sections(TJECosmetics.from_world(inputs), patch)
+    binary = patch.get_token_binary()
+    size = max(token_span(token)[1] for token in parse_token_binary(binary))
+    base_image = random.Random(seed).randbytes(size)
+
+    times = []
+    for _ in range(images):
+        rom = bytearray(base_image)
+        start = time.perf_counter()
+        apply_tokens(rom, parse_token_binary(binary))
+        times.append(time.perf_counter() - start)
+    return times
+
+def report(name: str, times: list[float]) -> None:
+    print(f"{name}: median {statistics.median(times):.3f}s, min {min(times):.3f}s, max {max(times):.3f}s "
+          f"over {len(times)} run(s)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TJE generation benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    stages_parser = subparsers.add_parser("stages", help="time and trace each generation stage over an option matrix")
+    stages_parser.add_argument("--players", type=int, nargs="+", default=[1, 10, 100])
+    stages_parser.add_argument("--configs", nargs="+", choices=STAGE_CONFIGS, default=list(STAGE_CONFIGS))
+    stages_parser.add_argument("--seed", type=int, default=0)
+    stages_parser.add_argument("--no-trace", action="store_true", help="skip allocation tracing for cleaner timings")
+    stages_parser.add_argument("--output", help="write results to this JSON file")
+    stages_parser.add_argument("--baseline", help="compare results against this JSON file")
+    stages_parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown counted as a regression")
+
+    fill_parser = subparsers.add_parser("fill", help="time item fill for a multiworld of TJE slots")
+    fill_parser.add_argument("--players", type=int, default=50)
+    fill_parser.add_argument("--seed", type=int, default=0)
+    fill_parser.add_argument("--repeats", type=int, default=3)
+
+    memory_parser = subparsers.add_parser("memory", help="measure peak memory of generating TJE slots up to fill")
+    memory_parser.add_argument("--players", type=int, default=100)
+    memory_parser.add_argument("--seed", type=int, default=0)
+
+    earthling_parser = subparsers.add_parser("earthlings", help="time Earthling generation per niceness level")
+    earthling_parser.add_argument("--last-level", type=int, default=25)
+    earthling_parser.add_argument("--seed", type=int, default=0)
+    earthling_parser.add_argument("--repeats", type=int, default=1000)
+
+    items_parser = subparsers.add_parser("items", help="time random filler item generation")
+    items_parser.add_argument("--number", type=int, default=600)
+    items_parser.add_argument("--seed", type=int, default=0)
+    items_parser.add_argument("--repeats", type=int, default=1000)
+
+    prices_parser = subparsers.add_parser("prices", help="time mailbox price generation")
+    prices_parser.add_argument("--mailboxes", type=int, default=8)
+    prices_parser.add_argument("--bucks", type=int, nargs="+", default=[100, 10_000, 1_000_000])
+    prices_parser.add_argument("--seed", type=int, default=0)
+    prices_parser.add_argument("--repeats", type=int, default=100)
+
+    tokens_parser = subparsers.add_parser("tokens", help="time in-memory patch token application")
+    tokens_parser.add_argument("--images", type=int, default=1000)
+    tokens_parser.add_argument("--seed", type=int, default=0)
+    tokens_parser.add_argument("--trace", action="store_true", help="print the regions each patching section wrote")
+
+    args = parser.parse_args()
+    match args.benchmark:
+        case "stages":
+            baseline = None
+            if args.baseline:
+                with open(args.baseline) as f:
+                    baseline = json.load(f)
+
+            results = run_stage_suite(args.players, args.configs, args.seed, not args.no_trace)
+            if args.output:
+                with open(args.output, "w") as f:
+                    json.dump(results, f, indent=2)
+            if baseline:
+                regressions = compare_stages(results, baseline, args.threshold)
+                print(f"{regressions} regression(s) against {args.baseline}")
+                sys.exit(1 if regressions else 0)
+        case "fill":
+            report(f"Fill ({args.players} TJE slots)", bench_fill(args.players, args.seed, args.repeats))
+        case "memory":
+            traced_peak, peak_rss = bench_memory(args.players, args.seed)
+            print(f"Memory ({args.players} TJE slots): traced peak {traced_peak/2**20:.1f} MiB, "
+                  f"peak RSS {peak_rss/2**20:.1f} MiB")
+        case "earthlings":
+            for niceness in range(1, 5):
+                report(f"Earthlings (niceness {niceness}, last level {args.last_level})",
+                       bench_earthlings(niceness, args.last_level, args.seed, args.repeats))
+        case "items":
+            report(f"Item blob ({args.number} items)", bench_item_blob(args.number, args.seed, args.repeats))
+        case "prices":
+            for total_bucks in args.bucks:
+                report(f"Prices ({args.mailboxes} mailboxes, {total_bucks} bucks)",
+                       bench_prices(args.mailboxes, total_bucks, args.seed, args.repeats))
+        case "tokens":
+            report(f"Token application ({args.images} images)", bench_tokens(args.seed, args.images, args.trace))
+
+if __name__ == "__main__":
+    main()
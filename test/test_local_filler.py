@@ -0,0 +1,47 @@
+from BaseClasses import ItemClassification, LocationProgressType
+from test.bases import WorldTestBase
+
+from ..locations import FLOOR_ITEM_LOCATION_NAMES
+
+EXCLUDED = tuple(f"Level {level} - Item {n}" for level in (1, 2, 3) for n in (1, 2, 3, 4))
+PRIORITY = tuple(f"Level {level} - Item {n}" for level in (4, 5) for n in (1, 2))
+
+class TJELocalFillerTestBase(WorldTestBase):
+    game = "ToeJam and Earl"
+
+    # Filler placed before the main fill, and how many of the world's plain filler items there were in all
+    def local_filler(self) -> tuple[list, int]:
+        placed = [loc for loc in self.multiworld.get_locations(self.player)
+                  if loc.name in FLOOR_ITEM_LOCATION_NAMES and loc.item is not None
+                  and loc.item.classification == ItemClassification.filler]
+        unplaced = [item for item in self.multiworld.itempool
+                    if item.player == self.player and item.classification == ItemClassification.filler]
+        return placed, len(placed) + len(unplaced)
+
+class TestLocalFillerExcludedOnly(TJELocalFillerTestBase):
+    options = {
+        "local_filler_percentage": 1,
+        "exclude_locations": set(EXCLUDED),
+    }
+
+    def test_uses_only_excluded_locations(self) -> None:
+        placed, total = self.local_filler()
+        self.assertEqual(len(placed), round(total/100))
+        self.assertLessEqual(len(placed), len(EXCLUDED))
+        for loc in placed:
+            self.assertEqual(loc.progress_type, LocationProgressType.EXCLUDED, loc.name)
+
+class TestLocalFillerFallback(TJELocalFillerTestBase):
+    options = {
+        "local_filler_percentage": 100,
+        "exclude_locations": set(EXCLUDED),
+        "priority_locations": set(PRIORITY),
+    }
+
+    # Once the excluded locations are full, the rest goes into default ones, but never priority ones
+    def test_falls_back_to_default_locations(self) -> None:
+        placed, _ = self.local_filler()
+        placed_names = {loc.name for loc in placed}
+        self.assertTrue(set(EXCLUDED) <= placed_names)
+        self.assertTrue(placed_names.isdisjoint(PRIORITY))
+        self.assertTrue(any(loc.progress_type == LocationProgressType.DEFAULT for loc in placed))
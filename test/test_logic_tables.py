@@ -0,0 +1,11 @@
+import unittest
+
+from ..logic_tables import decode_tables
+from ..tools.build_logic_tables import OUTPUT_PATH, compute_tables, encode_tables
+
+class TestLogicTables(unittest.TestCase):
+    # Rebuilds every table from the live functions (slow: tens of seconds), so the shipped file can't drift from them
+    def test_shipped_tables_match(self) -> None:
+        rebuilt = decode_tables(encode_tables(*compute_tables()))
+        self.assertEqual(rebuilt, decode_tables(OUTPUT_PATH.read_bytes()),
+                         "data/logic_tables.bin is out of date; rebuild it with tools/build_logic_tables.py")
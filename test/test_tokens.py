@@ -0,0 +1,61 @@
+import unittest
+from types import SimpleNamespace
+
+from worlds.Files import APTokenTypes
+
+from ..items import ITEM_NAME_TO_ID
+from ..options import TJEOptions
+from ..rom import PATCH_OPTIONS, TJECosmetics, TJEPatchInputs, TJEProcedurePatch, build_patch_tables, \
+                  write_cosmetic_sections, write_patch_sections
+from ..tokens import apply_tokens, coalesce_tokens, token_span
+
+# Options away from their defaults for each case; everything else stays at its default
+OPTION_SETS = (
+    {},
+    {"expanded_inventory": True, "max_rank_check": 0},
+    {"expanded_inventory": True, "max_rank_check": 8, "point_presents": True, "mailbox_checks": True},
+    {"expanded_inventory": False, "max_rank_check": 0, "mailbox_checks": True, "sound_rando": "all"},
+    {"death_link": True, "game_overs": "drop_down", "last_level": 11, "character": "both", "map_rando": "base_shuffle",
+     "point_presents": True, "unused_present_sprites": True, "walk_speed": 150, "present_timers": 200},
+    {"elevator_keys": False, "starting_presents": "none", "map_rando": "mapsanity", "sound_rando": "most"},
+)
+
+def patch_inputs(values: dict) -> TJEPatchInputs:
+    options = SimpleNamespace(**{name: TJEOptions.type_hints[name].from_any(
+        values.get(name, TJEOptions.type_hints[name].default)) for name in PATCH_OPTIONS})
+    last_level = options.last_level.value
+    mailbox_levels = [2, 5, 8] if options.mailbox_checks else []
+    key_gap = options.key_gap.value
+    tables = build_patch_tables(1, last_level, mailbox_levels, [10]*3*len(mailbox_levels), ())
+    return TJEPatchInputs(
+        player=1, player_name="Player", output_path="", rev00=False, reference_base_patches=False,
+        patch_random_seed=0, options=options, seeds=list(range(26)), ship_item_levels=[2]*10,
+        key_levels=list(range(key_gap, last_level, key_gap)) if options.elevator_keys else [],
+        mailbox_levels=mailbox_levels, starting_presents=[ITEM_NAME_TO_ID["Bonus Hitops"]]*8,
+        earthling_list=[[0]*20]*24, map_reveal_potencies=[5]*5, rank_thresholds=list(range(0, 900, 100)),
+        point_present_value=25, **tables._asdict(),
+    )
+
+def patched_image(tokens) -> bytearray:
+    rom = bytearray(max(token_span(token)[1] for token in tokens))
+    apply_tokens(rom, tokens)
+    return rom
+
+class TestTokens(unittest.TestCase):
+    def test_coalesced_tokens_match(self) -> None:
+        for values in OPTION_SETS:
+            with self.subTest(**values):
+                inputs = patch_inputs(values)
+                patch = TJEProcedurePatch()
+                write_patch_sections(inputs, patch)
+                write_cosmetic_sections(TJECosmetics.from_world(inputs), patch)
+                coalesced = coalesce_tokens(patch._tokens, patch.override_tokens)
+                self.assertEqual(patched_image(coalesced), patched_image(patch._tokens))
+
+    def test_nested_write_needs_override(self) -> None:
+        tokens = [(APTokenTypes.WRITE, 0x100, b"\x4e\xf9\x00\x10\xbb\x00"), (APTokenTypes.WRITE, 0x104, b"\xed\x80")]
+        with self.assertRaises(ValueError):
+            coalesce_tokens(tokens)
+        self.assertEqual(coalesce_tokens(tokens, {1}), [(APTokenTypes.WRITE, 0x100, b"\x4e\xf9\x00\x10\xed\x80")])
+        # Rewriting the same bytes is always allowed
+        self.assertEqual(len(coalesce_tokens(tokens[:1] + [(APTokenTypes.WRITE, 0x104, b"\xbb\x00")])), 1)
@@ -0,0 +1,211 @@
+"""
+Mass-seed validation for the TJE world. Not collected by the unit test runner.
+
+Rolls single-player seeds with randomised logic-relevant options, generates each one up to and including fill
+across a process pool, and reports invariant violations and per-stage timings. Patch tokens are built in memory
+to check they coalesce cleanly, but no patch files are written.
+
+Run from the root of an Archipelago checkout, e.g.:
+    python -m worlds.tje.test.validate_seeds --seeds 10000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import traceback
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from BaseClasses import MultiWorld
+from Options import Choice, Range, Toggle
+from worlds.AutoWorld import call_all
+
+from .. import TJEWorld
+from ..generators import expected_map_points
+from ..items import ITEM_GROUPS
+from ..logic import SHIP_PIECE_COUNTER, RankRule
+from ..rom import TJECosmetics, TJEProcedurePatch, write_cosmetic_sections, write_patch_sections
+from ..tokens import apply_tokens, coalesce_tokens, token_span
+from .benchmark import BASE_OPTIONS, PRE_FILL_STEPS, fill, setup_multiworld
+
+# Options that change logic or the item pool; everything else stays at its default
+ROLLED_OPTIONS = ("last_level", "min_items", "max_items", "elevator_keys", "key_gap", "max_rank_check",
+                  "rank_rescaling", "reach_level_checks", "mailbox_checks", "lemonade_check", "point_presents",
+                  "upwarp_present", "bad_presents", "bad_food", "game_overs", "trap_percentage", "map_reveals",
+                  "local_map_reveals", "local_ship_pieces", "starting_presents", "earthling_rando",
+                  "earthling_rando_niceness", "map_rando", "presentsanity", "local_filler_percentage")
+
+# Upper bounds (in seconds) of the timing histogram buckets; the last bucket is unbounded
+HISTOGRAM_BUCKETS = (0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1, 3)
+
+def roll_options(seed: int) -> dict[str, Any]:
+    rng = random.Random(seed)
+    options = {}
+    for name in ROLLED_OPTIONS:
+        option = TJEWorld.options_dataclass.type_hints[name]
+        if issubclass(option, Range):
+            options[name] = rng.randint(option.range_start, option.range_end)
+        elif issubclass(option, (Choice, Toggle)):
+            options[name] = rng.choice(sorted(set(option.options.values())))
+    return BASE_OPTIONS | options
+
+#region Invariants
+
+def check_ranks(multiworld: MultiWorld, world: TJEWorld, state) -> list[str]:
+    max_rank = world.options.max_rank_check.value
+    if max_rank == 0:
+        return []
+    violations = []
+
+    points_goal = world.rank_thresholds[max_rank]
+    points_in_pool = sum(item.point_value for item in multiworld.get_items() if item.player == world.player)
+    if points_in_pool + expected_map_points(world.options.last_level.value) < points_goal:
+        violations.append("promotions under-filled")
+
+    rank_locations = [loc for loc in multiworld.get_locations(world.player) if isinstance(loc.access_rule, RankRule)]
+    if not all(loc.can_reach(state) for loc in rank_locations):
+        violations.append("rank threshold unreachable")
+    return violations
+
+def check_prices(world: TJEWorld, state) -> list[str]:
+    if not world.options.mailbox_checks:
+        return []
+    violations = []
+
+    prices = world.mailbox_item_prices
+    num_items = len(prices)
+    if num_items == 0:
+        return []
+    max_price = round(2*world.total_bucks/num_items)
+    budget = min(world.total_bucks - round(10/100*world.total_bucks), num_items*max_price)
+    if sum(prices) != budget:
+        violations.append("prices miss the buck budget")
+    if any(not 0 <= price <= max_price for price in prices):
+        violations.append("price out of range")
+    if state.prog_items[world.player]["bucks"] < 0:
+        violations.append("bucks overspent")
+    return violations
+
+def patched_image(tokens) -> bytearray:
+    rom = bytearray(max((token_span(token)[1] for token in tokens), default=0))
+    apply_tokens(rom, tokens)
+    return rom
+
+def check_tokens(world: TJEWorld) -> list[str]:
+    patch = TJEProcedurePatch(player=world.player, player_name=world.player_name)
+    inputs = world.patch_inputs("", False)
+    write_patch_sections(inputs, patch)
+    write_cosmetic_sections(TJECosmetics.from_world(inputs), patch)
+    try:
+        coalesced = coalesce_tokens(patch._tokens, patch.override_tokens)
+    except ValueError:
+        return ["conflicting patch writes"]
+    if patched_image(coalesced) != patched_image(patch._tokens):
+        return ["coalesced tokens differ"]
+    return []
+
+def check_seed(multiworld: MultiWorld) -> list[str]:
+    world = multiworld.worlds[1]
+    state = multiworld.get_all_state(False)
+
+    violations = []
+    if not multiworld.can_beat_game(state):
+        violations.append("unbeatable")
+    if any(loc.item is None for loc in multiworld.get_locations()):
+        violations.append("unfilled locations")
+    if any(not loc.can_reach(state) for loc in multiworld.get_locations()):
+        violations.append("unreachable locations")
+    if state.prog_items[world.player][SHIP_PIECE_COUNTER] != len(ITEM_GROUPS["Ship Pieces"]):
+        violations.append("ship pieces missing")
+    return violations + check_ranks(multiworld, world, state) + check_prices(world, state) + check_tokens(world)
+
+#endregion
+
+def validate_seed(seed: int) -> dict[str, Any]:
+    options = roll_options(seed)
+    timings = {}
+    try:
+        multiworld = setup_multiworld(1, seed, options)
+        for step in PRE_FILL_STEPS:
+            if hasattr(TJEWorld, step):
+                start = time.perf_counter()
+                call_all(multiworld, step)
+                timings[step] = time.perf_counter() - start
+        start = time.perf_counter()
+        fill(multiworld)
+        timings["fill"] = time.perf_counter() - start
+
+        violations = check_seed(multiworld)
+    except Exception:
+        return {"seed": seed, "options": options, "violations": ["exception"], "timings": timings,
+                "traceback": traceback.format_exc()}
+    return {"seed": seed, "options": options, "violations": violations, "timings": timings}
+
+def histogram(times: list[float]) -> list[int]:
+    counts = [0]*(len(HISTOGRAM_BUCKETS)+1)
+    for t in times:
+        counts[next((i for i, bound in enumerate(HISTOGRAM_BUCKETS) if t <= bound), len(HISTOGRAM_BUCKETS))] += 1
+    return counts
+
+def summarise(results: list[dict[str, Any]]) -> dict[str, Any]:
+    violation_counts = Counter(v for result in results for v in result["violations"])
+    examples = defaultdict(list)
+    for result in results:
+        for v in result["violations"]:
+            if len(examples[v]) < 5:
+                examples[v].append(result["seed"])
+
+    stage_times = defaultdict(list)
+    for result in results:
+        for stage, t in result["timings"].items():
+            stage_times[stage].append(t)
+
+    return {
+        "seeds": len(results),
+        "violations": dict(violation_counts),
+        "example_seeds": dict(examples),
+        "histogram_buckets": list(HISTOGRAM_BUCKETS),
+        "timings": {stage: {"total": sum(times), "histogram": histogram(times)} for stage, times in stage_times.items()},
+    }
+
+def report(summary: dict[str, Any]) -> None:
+    print(f"{summary['seeds']} seed(s) validated")
+    for violation, count in sorted(summary["violations"].items(), key=lambda kv: -kv[1]):
+        print(f"  {violation}: {count} (e.g. seeds {summary['example_seeds'][violation]})")
+
+    labels = [f"<={bound}s" for bound in HISTOGRAM_BUCKETS] + [">"]
+    print("Stage timings:")
+    for stage, stats in summary["timings"].items():
+        buckets = " ".join(f"{label}:{n}" for label, n in zip(labels, stats["histogram"]) if n)
+        print(f"  {stage}: {stats['total']:.1f}s total; {buckets}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate TJE generation invariants over many seeds")
+    parser.add_argument("--seeds", type=int, default=1000)
+    parser.add_argument("--start", type=int, default=0, help="first seed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="write the summary and failing seeds to this JSON file")
+    args = parser.parse_args()
+
+    seeds = range(args.start, args.start + args.seeds)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(validate_seed, seeds, chunksize=max(1, args.seeds // (args.workers*8))))
+
+    summary = summarise(results)
+    report(summary)
+    for result in results:
+        if "traceback" in result:
+            print(f"Seed {result['seed']} raised:\n{result['traceback']}")
+            break
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary | {"failures": [r for r in results if r["violations"]]}, f, indent=2)
+    sys.exit(1 if summary["violations"] else 0)
+
+if __name__ == "__main__":
+    main()
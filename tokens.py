@@ -0,0 +1,140 @@
+import struct
+from typing import Collection, Iterable, NamedTuple
+
+from worlds.Files import APTokenTypes
+
+# Works on APTokenMixin token lists directly, outside the APProcedurePatch pipeline: parsing a token binary,
+# applying tokens to a ROM image in place, and merging or checking overlapping writes
+
+Token = tuple[APTokenTypes, int, bytes]
+
+class Overlap(NamedTuple):
+    start: int
+    end: int
+    first: int # Indices into the span list, in write order
+    second: int
+
+#region Parsing and application
+
+# Inverse of APTokenMixin.get_token_binary; token data are views into the binary, not copies
+def parse_token_binary(binary: bytes) -> list[Token]:
+    view = memoryview(binary)
+    (count,) = struct.unpack_from("<I", view, 0)
+    tokens = []
+    pos = 4
+    for _ in range(count):
+        offset, size = struct.unpack_from("<II", view, pos+1)
+        tokens.append((APTokenTypes(view[pos]), offset, view[pos+9:pos+9+size]))
+        pos += 9 + size
+    if pos != len(view):
+        raise ValueError(f"Token binary has {len(view) - pos} trailing byte(s)")
+    return tokens
+
+def token_span(token: Token) -> tuple[int, int]:
+    token_type, offset, data = token
+    match token_type:
+        case APTokenTypes.WRITE:
+            return offset, offset + len(data)
+        case APTokenTypes.COPY | APTokenTypes.RLE:
+            return offset, offset + int.from_bytes(data[:4], "little")
+        case _:
+            return offset, offset + 1
+
+# Same result as APTokenMixin's apply_tokens procedure step, but writes straight into the given bytearray or
+# writable memoryview. The image is never resized; a token running past its end raises IndexError
+def apply_tokens(rom: bytearray | memoryview, tokens: Iterable[Token]) -> None:
+    size = len(rom)
+    for token in tokens:
+        token_type, offset, data = token
+        start, end = token_span(token)
+        if end > size:
+            raise IndexError(f"Token at 0x{start:08x}–0x{end:08x} runs past the end of a 0x{size:08x} byte ROM")
+
+        match token_type:
+            case APTokenTypes.WRITE:
+                rom[start:end] = data
+            case APTokenTypes.COPY:
+                source = int.from_bytes(data[4:], "little")
+                rom[start:end] = rom[source:source+end-start]
+            case APTokenTypes.RLE:
+                rom[start:end] = bytes((int.from_bytes(data[4:], "little"),)) * (end - start)
+            case APTokenTypes.AND_8:
+                rom[offset] &= data[0]
+            case APTokenTypes.OR_8:
+                rom[offset] |= data[0]
+            case APTokenTypes.XOR_8:
+                rom[offset] ^= data[0]
+
+#endregion
+
+#region Coalescing and overlap checks
+
+# Merges overlapping and contiguous writes into single tokens, giving the same result when applied.
+# Overlapping writes must either write the same bytes, or be overrides (given by index in write order) lying
+# entirely within one earlier write, e.g. patching a value inside a code blob; anything else is almost certainly
+# two sections clobbering each other. Token lists containing anything other than plain writes are returned as is.
+def coalesce_tokens(tokens: list[Token], overrides: Collection[int] = frozenset()) -> list[Token]:
+    if any(token_type != APTokenTypes.WRITE for token_type, _, _ in tokens):
+        return tokens
+
+    writes = sorted(((offset, offset+len(data), order, data, order in overrides)
+                     for order, (_, offset, data) in enumerate(tokens)),
+                    key=lambda write: (write[0], write[2]))
+    runs, run = [], []
+    run_end = -1
+    for write in writes:
+        start, end = write[:2]
+        if start > run_end and run:
+            runs.append(run)
+            run = []
+        for other in run:
+            if other[1] > start:
+                check_overlap(other, write)
+        run.append(write)
+        run_end = max(run_end, end) if len(run) > 1 else end
+    if run:
+        runs.append(run)
+
+    coalesced = []
+    for run in runs:
+        run_start = run[0][0]
+        buffer = bytearray(max(write[1] for write in run) - run_start)
+        for start, end, _, data, _ in sorted(run, key=lambda write: write[2]):
+            buffer[start-run_start:end-run_start] = data
+        coalesced.append((APTokenTypes.WRITE, run_start, bytes(buffer)))
+    return coalesced
+
+# Writes are (start, end, order, data, override)
+def check_overlap(first: tuple, second: tuple) -> None:
+    earlier, later = sorted((first, second), key=lambda write: write[2])
+    if later[4] and earlier[0] <= later[0] and later[1] <= earlier[1]:
+        return
+    start, end = max(first[0], second[0]), min(first[1], second[1])
+    if memoryview(first[3])[start-first[0]:end-first[0]] == memoryview(second[3])[start-second[0]:end-second[0]]:
+        return
+    raise ValueError(f"Conflicting patch writes to 0x{start:08x}–0x{end:08x}")
+
+# Every pair of overlapping spans, for reporting rather than rejecting
+def find_overlaps(spans: list[tuple[int, int]]) -> list[Overlap]:
+    overlaps = []
+    active = []
+    for index in sorted(range(len(spans)), key=lambda i: spans[i]):
+        start, end = spans[index]
+        active = [other for other in active if spans[other][1] > start]
+        for other in active:
+            first, second = sorted((other, index))
+            overlaps.append(Overlap(start, min(end, spans[other][1]), first, second))
+        active.append(index)
+    return sorted(overlaps)
+
+# Contiguous or overlapping spans joined into sorted, disjoint regions
+def merge_spans(spans: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    regions = []
+    for start, end in sorted(spans):
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+    return regions
+
+#endregion
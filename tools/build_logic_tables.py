@@ -0,0 +1,58 @@
+"""
+Builds data/logic_tables.bin from the live logic functions, or checks that the shipped table still matches them.
+
+Run from the root of an Archipelago checkout after changing any of the functions it covers:
+    python -m worlds.tje.tools.build_logic_tables [--check]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from ..generators import scaled_rank_thresholds, item_totals
+from ..logic_tables import TABLE_PATH, RANK_KEYS, ITEM_TOTAL_KEYS, NUM_LEVELS, encode_tables, decode_tables, \
+                           lookup_rank_thresholds, lookup_item_totals, load_tables
+
+OUTPUT_PATH = Path(__file__).parent.parent / TABLE_PATH
+
+def compute_tables() -> tuple[list[list[int]], list[list[int]]]:
+    rank_thresholds = [scaled_rank_thresholds(*key) for key in RANK_KEYS]
+    totals = [item_totals(True, min_items, max_items, NUM_LEVELS-1) for min_items, max_items in ITEM_TOTAL_KEYS]
+    if any(not 0 <= v < 2**16 for row in rank_thresholds + totals for v in row):
+        raise ValueError("Table value out of u16 range")
+    return rank_thresholds, totals
+
+def check_tables() -> int:
+    load_tables.cache_clear()
+    decode_tables(OUTPUT_PATH.read_bytes())
+
+    mismatches = 0
+    for key in RANK_KEYS:
+        if lookup_rank_thresholds(*key) != scaled_rank_thresholds(*key):
+            print(f"Rank thresholds differ for (last_level, min_items, max_items, max_rank) = {key}")
+            mismatches += 1
+    for min_items, max_items in ITEM_TOTAL_KEYS:
+        for last_level in range(NUM_LEVELS):
+            if lookup_item_totals(min_items, max_items, last_level) != item_totals(True, min_items, max_items,
+                                                                                   last_level):
+                print(f"Item totals differ for (min_items, max_items, last_level) = "
+                      f"{(min_items, max_items, last_level)}")
+                mismatches += 1
+    return mismatches
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or check the precomputed TJE logic tables")
+    parser.add_argument("--check", action="store_true", help="compare the shipped table against the live functions")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_tables()
+        print(f"{mismatches} mismatch(es) in {OUTPUT_PATH}")
+        sys.exit(1 if mismatches else 0)
+
+    data = encode_tables(*compute_tables())
+    OUTPUT_PATH.write_bytes(data)
+    print(f"Wrote {len(data)} bytes to {OUTPUT_PATH}")
+
+if __name__ == "__main__":
+    main()
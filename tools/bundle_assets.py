@@ -0,0 +1,76 @@
+"""
+Packs every compiled code and sprite blob, plus the dynamic repatch offsets and the precompiled option patches,
+into data/assets.bin. Called by compile_asm.py and png2spr.py after they write their output; can also be run on
+its own.
+
+Layout: magic, version byte, u32 (LE) index length, JSON index, then the blobs back to back.
+The index maps "asm"/"sprite" blob names to [offset, size] relative to the end of the index, holds the
+offsets under "dro", and lists the entries of asm/optional_patches.json5 under "options", each with its
+conditions, the [offset, size] of its token binary (in APTokenMixin format) and the indices of its override
+tokens: those addressed through a repatch offset, which are meant to land inside an earlier blob.
+"""
+
+import json
+import struct
+from pathlib import Path
+
+import pyjson5
+
+DATA_DIR = Path(__file__).absolute().parents[1] / "data"
+OPTION_PATCHES_PATH = Path(__file__).absolute().parent / "asm" / "optional_patches.json5"
+BUNDLE_MAGIC, BUNDLE_VERSION = b"TJEA", 3
+TOKEN_WRITE = 0 # APTokenTypes.WRITE
+
+def resolve_address(address: int | dict, dro: dict[str, dict[str, int]]) -> int:
+    if isinstance(address, int):
+        return address
+    blob_name, offset_name = address["dro"].split(".")
+    return address["base"] + dro[blob_name][offset_name]
+
+def compile_token_binary(patches: list[dict], blobs: dict[str, dict[str, bytes]],
+                         dro: dict[str, dict[str, int]]) -> tuple[bytes, list[int]]:
+    tokens, overrides = [], []
+    for patch in patches:
+        if "data" in patch:
+            data = bytes(patch["data"])
+        else:
+            data = blobs["sprite" if patch.get("sprite") else "asm"][patch["filename"]]
+        for address in patch["addresses"]:
+            if isinstance(address, dict):
+                overrides.append(len(tokens))
+            tokens.append((resolve_address(address, dro) + patch.get("offset", 0), data))
+
+    binary = bytearray(struct.pack("<I", len(tokens)))
+    for offset, data in tokens:
+        binary += bytes([TOKEN_WRITE]) + struct.pack("<II", offset, len(data)) + data
+    return bytes(binary), overrides
+
+def write_asset_bundle(data_dir: Path = DATA_DIR) -> Path:
+    index = {"asm": {}, "sprite": {}}
+    blobs = {"asm": {}, "sprite": {}}
+    bundle_data = bytearray()
+    for kind, subdir in (("asm", "asm_bin"), ("sprite", "sprites_bin")):
+        for path in sorted((data_dir / subdir).glob("*.bin")):
+            data = path.read_bytes()
+            index[kind][path.stem] = [len(bundle_data), len(data)]
+            blobs[kind][path.stem] = data
+            bundle_data += data
+    index["dro"] = json.loads((data_dir / "json" / "dynamic_repatch_offsets.json").read_text())
+
+    index["options"] = []
+    for entry in pyjson5.decode(OPTION_PATCHES_PATH.read_text())["entries"]:
+        binary, overrides = compile_token_binary(entry["patches"], blobs, index["dro"])
+        index["options"].append({"when": entry.get("when", {}), "unless": entry.get("unless", {}),
+                                 "tokens": [len(bundle_data), len(binary)], "overrides": overrides})
+        bundle_data += binary
+
+    index_bytes = json.dumps(index, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    out_path = data_dir / "assets.bin"
+    with out_path.open("wb") as f:
+        f.write(BUNDLE_MAGIC + bytes([BUNDLE_VERSION]) + struct.pack("<I", len(index_bytes)))
+        f.write(index_bytes)
+        f.write(bundle_data)
+    return out_path
+
+if __name__ == "__main__":
+    print(f"Wrote {write_asset_bundle()}")
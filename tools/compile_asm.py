@@ -9,6 +9,8 @@ from collections import defaultdict
 
 import yaml
 
+from bundle_assets import write_asset_bundle
+
 parser = argparse.ArgumentParser()
 parser.add_argument("-f", "--force", action="store_true")
 args = parser.parse_args()
@@ -108,6 +110,8 @@ if not JSON_DIR.exists():
 with (JSON_DIR / REPATCH_JSON_FN).open("w") as f:
     json.dump(repatch_list, f, indent=2)
 
+print(f"Rebuilt asset bundle {write_asset_bundle()}")
+
 # Update config
 
 yaml_data["last_compiled_time"] = time.time()
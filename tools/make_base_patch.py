@@ -48,5 +48,5 @@ diff = bsdiff4.diff(bytes(original_rom), bytes(patched_rom))
 with open("../data/base_patch.bsdiff4", "wb") as f:
     f.write(diff)
 
-# create json-formatted optional patches for use in rom.py
+# optional patches (asm/optional_patches.json5) are compiled into data/assets.bin by bundle_assets.py
 
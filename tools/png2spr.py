@@ -4,6 +4,8 @@ from pathlib import Path
 from PIL import Image
 from PIL.ImageColor import getrgb as rgb
 
+from bundle_assets import write_asset_bundle
+
 type Palette = dict[int, tuple[int]]
 
 #region Palettes
@@ -151,5 +153,8 @@ def png_to_data(filepath: Path) -> None:
         f.write(out_data)
     print("Done!")
 
+# Converts every PNG given, then rebuilds the asset bundle once
 if __name__ == "__main__":
-    png_to_data(Path(sys.argv[1]))
\ No newline at end of file
+    for arg in sys.argv[1:]:
+        png_to_data(Path(arg))
+    print(f"Rebuilt asset bundle {write_asset_bundle()}")
\ No newline at end of file